@@ -0,0 +1,243 @@
+"""
+Benchmark of VKAPIClient and APIYaDiClient against local mock servers.
+
+For every album size the photos are fetched from MockVKServer and the
+first of them are uploaded to MockYandexServer, sequentially (one worker)
+and concurrently, in each transfer mode. The report shows the throughput
+and the p50/p99 latency of HTTP requests of both stages and the peak
+memory traced by tracemalloc.
+
+Run from the repository root:
+
+    python benchmarks/bench_backup.py --sizes 100 1000 10000 50000
+
+Use --json to save the results and compare them between revisions.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from vk_backup import (APIYaDiClient, BackupCallbacks, RetryPolicy,
+                       VKAPIClient, create_session)
+from mock_servers import MockVKServer, MockYandexServer
+
+
+OWNER_ID = 1
+
+
+class LatencyRecorder:
+    """
+    A response hook of requests sessions that records request latencies.
+
+    Attributes:
+        latencies (list[float]): The times to response headers in seconds.
+    """
+
+    def __init__(self):
+        """
+        Initialize the LatencyRecorder.
+        """
+        self.latencies = []
+
+    def __call__(self, response, *args, **kwargs):
+        """
+        Record the latency of a response.
+
+        Args:
+            response (requests.Response): The response.
+
+        Returns:
+            None
+        """
+        self.latencies.append(response.elapsed.total_seconds())
+
+    def reset(self) -> list[float]:
+        """
+        Take the recorded latencies and start recording anew.
+
+        Returns:
+            list[float]: The recorded latencies.
+        """
+        latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def get_percentiles(latencies: list[float]) -> tuple[float, float]:
+    """
+    Get the p50 and p99 latencies.
+
+    Args:
+        latencies (list[float]): The latencies in seconds.
+
+    Returns:
+        tuple[float, float]: The p50 and p99 latencies in milliseconds.
+    """
+    if len(latencies) < 2:
+        latency = latencies[0] * 1000 if latencies else 0.0
+        return latency, latency
+    quantiles = statistics.quantiles(latencies, n = 100)
+    return quantiles[49] * 1000, quantiles[98] * 1000
+
+
+def run_case(album_size: int, workers: int, transfer_mode: str,
+             args: argparse.Namespace) -> dict:
+    """
+    Fetch an album from the mock VK server and upload its first photos
+    to the mock Yandex Disk server.
+
+    Args:
+        album_size (int): The number of photos in the album.
+        workers (int): The max_workers of both clients.
+        transfer_mode (str): The transfer mode of APIYaDiClient.
+        args (argparse.Namespace): The command line arguments.
+
+    Returns:
+        dict: The measurements of the case.
+    """
+    yandex_server = MockYandexServer(args.yadi_latency, args.failure_rate,
+                                     args.operation_delay,
+                                     args.photo_size).start()
+    vk_server = MockVKServer({OWNER_ID: album_size}, yandex_server.url,
+                             args.vk_latency, args.failure_rate).start()
+    recorder = LatencyRecorder()
+    session = create_session(max(10, workers), backoff_factor = 0.01)
+    session.hooks['response'].append(recorder)
+    retry_policy = RetryPolicy(3, 0.01, 1)
+    callbacks = BackupCallbacks()
+    vk_client = VKAPIClient(OWNER_ID, 'token', max_workers = workers,
+                            session = session, callbacks = callbacks,
+                            retry_policy = retry_policy)
+    vk_client.API_BASE_URL = f'{vk_server.url}/method'
+    with tempfile.TemporaryDirectory() as result_directory:
+        yadi_client = APIYaDiClient(
+            'token', workers, session, callbacks = callbacks,
+            result_path = os.path.join(result_directory, 'result.jsonl'),
+            transfer_mode = transfer_mode, retry_policy = retry_policy)
+        yadi_client.BASE_API_YADI_URL = yandex_server.api_url
+        yadi_client.upload_session.hooks['response'].append(recorder)
+        upload_number = min(album_size, args.upload_limit)
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            photos = list(vk_client.iter_album_photos('profile'))
+            fetch_time = time.perf_counter() - start
+            fetch_latencies = recorder.reset()
+            start = time.perf_counter()
+            result_report = yadi_client.upload_photo(photos, upload_number,
+                                                     'benchmark')
+            upload_time = time.perf_counter() - start
+            upload_latencies = recorder.reset()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    vk_server.stop()
+    yandex_server.stop()
+    fetch_p50, fetch_p99 = get_percentiles(fetch_latencies)
+    upload_p50, upload_p99 = get_percentiles(upload_latencies)
+    return {
+        'album_size': album_size, 'workers': workers,
+        'transfer_mode': transfer_mode, 'fetched': len(photos),
+        'fetch_time': fetch_time,
+        'fetch_throughput': len(photos) / fetch_time,
+        'fetch_requests': len(fetch_latencies),
+        'fetch_p50_ms': fetch_p50, 'fetch_p99_ms': fetch_p99,
+        'uploaded': sum(report_entry['status'] == 'success'
+                        for report_entry in result_report),
+        'upload_time': upload_time,
+        'upload_throughput': upload_number / upload_time,
+        'upload_requests': len(upload_latencies),
+        'upload_p50_ms': upload_p50, 'upload_p99_ms': upload_p99,
+        'peak_memory_mb': peak_memory / 2 ** 20,
+    }
+
+
+def print_results(results: list[dict]):
+    """
+    Print the results as a table.
+
+    Args:
+        results (list[dict]): The measurements of all cases.
+
+    Returns:
+        None
+    """
+    header = (f'{"album":>7} {"mode":>6} {"workers":>7} '
+              f'{"fetch/s":>9} {"p50 ms":>7} {"p99 ms":>7} '
+              f'{"upload":>7} {"upload/s":>9} {"p50 ms":>7} {"p99 ms":>7} '
+              f'{"peak MB":>8}')
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f'{result["album_size"]:>7} {result["transfer_mode"]:>6} '
+              f'{result["workers"]:>7} '
+              f'{result["fetch_throughput"]:>9.0f} '
+              f'{result["fetch_p50_ms"]:>7.1f} '
+              f'{result["fetch_p99_ms"]:>7.1f} '
+              f'{result["uploaded"]:>7} '
+              f'{result["upload_throughput"]:>9.1f} '
+              f'{result["upload_p50_ms"]:>7.1f} '
+              f'{result["upload_p99_ms"]:>7.1f} '
+              f'{result["peak_memory_mb"]:>8.1f}')
+
+
+def main_benchmark(argv: list[str]) -> int:
+    """
+    Run the benchmark.
+
+    Args:
+        argv (list[str]): The command line arguments without the program
+        name.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(
+        description = 'Бенчмарк клиентов VK и Яндекс.Диска на локальных '
+                      'тестовых серверах')
+    parser.add_argument('--sizes', nargs = '+', type = int,
+                        default = [100, 1000, 10000, 50000],
+                        help = 'количество фотографий в альбоме')
+    parser.add_argument('--workers', type = int, default = 8,
+                        help = 'количество потоков параллельной загрузки')
+    parser.add_argument('--transfer-modes', nargs = '+',
+                        choices = APIYaDiClient.TRANSFER_MODES,
+                        default = list(APIYaDiClient.TRANSFER_MODES),
+                        help = 'способы загрузки')
+    parser.add_argument('--upload-limit', type = int, default = 500,
+                        help = 'наибольшее количество загружаемых '
+                               'фотографий')
+    parser.add_argument('--vk-latency', type = float, default = 0.02,
+                        help = 'задержка ответа VK в секундах')
+    parser.add_argument('--yadi-latency', type = float, default = 0.02,
+                        help = 'задержка ответа Яндекс.Диска в секундах')
+    parser.add_argument('--operation-delay', type = float, default = 0.0,
+                        help = 'время загрузки файла по ссылке в секундах')
+    parser.add_argument('--failure-rate', type = float, default = 0.0,
+                        help = 'доля запросов, завершающихся ошибкой')
+    parser.add_argument('--photo-size', type = int, default = 100_000,
+                        help = 'размер фотографии в байтах')
+    parser.add_argument('--json', help = 'файл для сохранения результатов')
+    args = parser.parse_args(argv)
+    results = []
+    for album_size in args.sizes:
+        for transfer_mode in args.transfer_modes:
+            for workers in dict.fromkeys((1, args.workers)):
+                results.append(run_case(album_size, workers, transfer_mode,
+                                        args))
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding = 'utf-8') as f:
+            json.dump(results, f, indent = 2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_benchmark(sys.argv[1:]))
@@ -0,0 +1,131 @@
+"""
+Benchmark of the startup time of the backup tool.
+
+Every case runs a fresh interpreter that imports a part of the vk_backup
+package or runs main.py, and the wall time of the process is measured.
+The report shows the median and the minimum time over the runs, the time
+over a bare interpreter and whether requests and tkinter were imported.
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py --runs 20
+
+Use --max-ms to fail when importing the API clients takes longer than
+the given time over a bare interpreter, and --json to save the results and
+compare them between revisions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPORT_MODULES = ('import sys; print(",".join(name for name in '
+                  '("requests", "tkinter") if name in sys.modules))')
+
+CASES = {
+    'interpreter': ['-c', 'pass'],
+    'package': ['-c', f'import vk_backup; {REPORT_MODULES}'],
+    'models': ['-c', 'from vk_backup import PhotoRecord, SizeSelector; '
+                     f'{REPORT_MODULES}'],
+    'clients': ['-c', 'from vk_backup import VKAPIClient, APIYaDiClient; '
+                      f'{REPORT_MODULES}'],
+    'cli': ['-c', f'import vk_backup.cli; {REPORT_MODULES}'],
+    'gui': ['-c', f'import vk_backup.gui; {REPORT_MODULES}'],
+    'main --help': ['main.py', '--help'],
+}
+
+
+def run_case(arguments: list[str], runs: int) -> tuple[list[float], str]:
+    """
+    Run a fresh interpreter several times.
+
+    Args:
+        arguments (list[str]): The arguments of the interpreter.
+        runs (int): The number of runs.
+
+    Returns:
+        tuple[list[float], str]: The wall times of the runs in seconds and
+        the last line of the output of the last run.
+
+    Raises:
+        subprocess.CalledProcessError: If the interpreter failed.
+    """
+    times = []
+    output = ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, *arguments],
+                                   cwd = ROOT_DIRECTORY, check = True,
+                                   capture_output = True, text = True)
+        times.append(time.perf_counter() - start)
+        output = completed.stdout
+    return times, (output.strip().splitlines() or [''])[-1]
+
+
+def main_benchmark(argv: list[str]) -> int:
+    """
+    Run the benchmark.
+
+    Args:
+        argv (list[str]): The command line arguments without the program
+        name.
+
+    Returns:
+        int: The exit code, 1 if the clients case exceeds --max-ms.
+    """
+    parser = argparse.ArgumentParser(
+        description = 'Бенчмарк времени запуска программы резервного '
+                      'копирования')
+    parser.add_argument('--runs', type = int, default = 20,
+                        help = 'количество запусков каждого случая')
+    parser.add_argument('--max-ms', type = float,
+                        help = 'наибольшее допустимое время импорта '
+                               'клиентов API сверх запуска интерпретатора '
+                               'в миллисекундах')
+    parser.add_argument('--json', help = 'файл для сохранения результатов')
+    args = parser.parse_args(argv)
+    results = []
+    baseline = None
+    for name, arguments in CASES.items():
+        times, output = run_case(arguments, args.runs)
+        median = statistics.median(times) * 1000
+        if baseline is None:
+            baseline = median
+        results.append({
+            'case': name, 'median_ms': median, 'min_ms': min(times) * 1000,
+            'over_interpreter_ms': median - baseline,
+            'modules': output if name not in ('interpreter', 'main --help')
+            else ''})
+    header = (f'{"case":<12} {"median ms":>10} {"min ms":>8} '
+              f'{"extra ms":>9}  modules')
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f'{result["case"]:<12} {result["median_ms"]:>10.1f} '
+              f'{result["min_ms"]:>8.1f} '
+              f'{result["over_interpreter_ms"]:>9.1f}  {result["modules"]}')
+    if args.json:
+        with open(args.json, 'w', encoding = 'utf-8') as f:
+            json.dump(results, f, indent = 2)
+    clients = next(result for result in results
+                   if result['case'] == 'clients')
+    if 'tkinter' in clients['modules']:
+        print('Клиенты API импортируют tkinter')
+        return 1
+    if args.max_ms is not None and \
+            clients['over_interpreter_ms'] > args.max_ms:
+        print(f'Импорт клиентов API занимает '
+              f'{clients["over_interpreter_ms"]:.1f} мс, больше '
+              f'{args.max_ms} мс')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_benchmark(sys.argv[1:]))
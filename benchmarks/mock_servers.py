@@ -0,0 +1,502 @@
+"""
+Local stand-ins for the VK API and the Yandex Disk API used by
+the benchmarks.
+
+MockVKServer serves photos.get and execute with pagination, photo sizes
+and VK errors, MockYandexServer serves the resources, upload and
+operations methods of Yandex Disk, the upload targets of streamed files
+and the photo files themselves. Both servers add a configurable latency to
+every request and fail a configurable share of requests the way the real
+APIs do when they are overloaded.
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    A local HTTP server on a free port with latency and failures.
+
+    Attributes:
+        latency (float): The delay of every response in seconds.
+        failure_rate (float): The share of requests that fail.
+        random (random.Random): The random generator of failures.
+        lock (threading.Lock): The lock of the server state.
+        requests_count (int): The number of handled requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler: type, latency: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = 0):
+        """
+        Initialize the MockServer.
+
+        Args:
+            handler (type): The request handler class.
+            latency (float, optional): The delay of every response in
+            seconds. Defaults to 0.0.
+            failure_rate (float, optional): The share of requests that fail.
+            Defaults to 0.0.
+            seed (int, optional): The seed of the random generator of
+            failures. Defaults to 0.
+        """
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests_count = 0
+
+    @property
+    def url(self) -> str:
+        """
+        Get the base URL of the server.
+
+        Returns:
+            str: The URL without a trailing slash.
+        """
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def start(self) -> 'MockServer':
+        """
+        Start serving requests in a daemon thread.
+
+        Returns:
+            MockServer: The server itself.
+        """
+        threading.Thread(target = self.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self):
+        """
+        Stop the server and close its socket.
+
+        Returns:
+            None
+        """
+        self.shutdown()
+        self.server_close()
+
+    def should_fail(self) -> bool:
+        """
+        Count a request and decide whether it fails.
+
+        Returns:
+            bool: True if the request fails.
+        """
+        with self.lock:
+            self.requests_count += 1
+            return self.random.random() < self.failure_rate
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    A base request handler of mock servers with keep-alive connections.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args):
+        """
+        Suppress the request log.
+        """
+
+    def read_body(self) -> bytes:
+        """
+        Read the request body, either with Content-Length or chunked.
+
+        Returns:
+            bytes: The body.
+        """
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if not size:
+                    self.rfile.readline()
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def send_body(self, status: int, body: bytes,
+                  content_type: str = 'application/json'):
+        """
+        Send a response after the latency of the server.
+
+        Args:
+            status (int): The status code.
+            body (bytes): The response body.
+            content_type (str, optional): The content type.
+            Defaults to 'application/json'.
+
+        Returns:
+            None
+        """
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, data: dict | list):
+        """
+        Send a JSON response.
+
+        Args:
+            status (int): The status code.
+            data (dict | list): The response object.
+
+        Returns:
+            None
+        """
+        self.send_body(status, json.dumps(data,
+                                          ensure_ascii = False).encode())
+
+    def get_query(self) -> tuple[str, dict]:
+        """
+        Split the request path into the path and the query parameters.
+
+        Returns:
+            tuple[str, dict]: The path and a dictionary of parameters.
+        """
+        url = urlparse(self.path)
+        return url.path, {key: values[0]
+                          for key, values in parse_qs(url.query).items()}
+
+
+class VKHandler(MockHandler):
+    """
+    A request handler of the VK API methods photos.get and execute.
+    """
+
+    CALL_PATTERN = re.compile(r'API\.photos\.get\((\{.*?\})\)')
+
+    def do_POST(self):
+        """
+        Handle a call of a VK API method.
+        """
+        method = urlparse(self.path).path.rpartition('/')[2]
+        params = {key: values[0] for key, values in
+                  parse_qs(self.read_body().decode()).items()}
+        if self.server.should_fail():
+            return self.send_json(200, {'error': {
+                'error_code': 6,
+                'error_msg': 'Too many requests per second'}})
+        if method == 'photos.get':
+            page = self.server.get_page(params)
+            if page is None:
+                return self.send_json(200, {'error': {
+                    'error_code': 30, 'error_msg': 'This profile is private'}})
+            return self.send_json(200, {'response': page})
+        if method == 'execute':
+            pages = [self.server.get_page(json.loads(call))
+                     for call in self.CALL_PATTERN.findall(params['code'])]
+            response = {'response': [page or False for page in pages]}
+            if None in pages:
+                response['execute_errors'] = [{
+                    'method': 'photos.get', 'error_code': 30,
+                    'error_msg': 'This profile is private'}]
+            return self.send_json(200, response)
+        self.send_json(200, {'error': {'error_code': 3,
+                                       'error_msg': 'Unknown method passed'}})
+
+
+class MockVKServer(MockServer):
+    """
+    A stand-in for the VK API with albums of generated photos.
+
+    Attributes:
+        albums (dict): The number of photos by owner ID. Owners missing from
+        the dictionary have private profiles.
+        photo_url (str): The base URL of photo files.
+    """
+
+    SIZE_TYPES = (('s', 75), ('m', 130), ('x', 604), ('y', 807),
+                  ('z', 1280), ('w', 2560))
+
+    def __init__(self, albums: dict[int, int], photo_url: str,
+                 latency: float = 0.0, failure_rate: float = 0.0,
+                 seed: int = 0):
+        """
+        Initialize the MockVKServer.
+
+        Args:
+            albums (dict[int, int]): The number of photos by owner ID.
+            photo_url (str): The base URL of photo files.
+            latency (float, optional): The delay of every response in
+            seconds. Defaults to 0.0.
+            failure_rate (float, optional): The share of requests that fail
+            with VK error 6. Defaults to 0.0.
+            seed (int, optional): The seed of the random generator of
+            failures. Defaults to 0.
+        """
+        super().__init__(VKHandler, latency, failure_rate, seed)
+        self.albums = albums
+        self.photo_url = photo_url
+
+    def get_photo(self, owner_id: int, photo_id: int) -> dict:
+        """
+        Generate a photo object of photos.get.
+
+        Args:
+            owner_id (int): The ID of the photo owner.
+            photo_id (int): The ID of the photo.
+
+        Returns:
+            dict: The photo object with likes and sizes.
+        """
+        sizes = [{'type': size_type, 'width': width,
+                  'height': width * 3 // 4,
+                  'url': f'{self.photo_url}/photo/{owner_id}_{photo_id}_'
+                         f'{size_type}.jpg?size={width}'}
+                 for size_type, width in self.SIZE_TYPES]
+        return {'id': photo_id, 'owner_id': owner_id,
+                'date': 1700000000 + photo_id * 60,
+                'likes': {'count': photo_id % 50, 'user_likes': 0},
+                'sizes': sizes, 'text': ''}
+
+    def get_page(self, params: dict) -> dict | None:
+        """
+        Generate a page of photos.get.
+
+        Args:
+            params (dict): The parameters of the photos.get call.
+
+        Returns:
+            dict | None: The 'response' object or None if the profile is
+            private.
+        """
+        owner_id = int(params['owner_id'])
+        if owner_id not in self.albums:
+            return None
+        photo_number = self.albums[owner_id]
+        offset = int(params.get('offset', 0))
+        count = int(params.get('count', 50))
+        return {'count': photo_number,
+                'items': [self.get_photo(owner_id, photo_id)
+                          for photo_id in range(
+                              offset, min(photo_number, offset + count))]}
+
+
+class YandexHandler(MockHandler):
+    """
+    A request handler of the Yandex Disk API, upload targets and photo
+    files.
+    """
+
+    def do_GET(self):
+        """
+        Handle a listing, an upload link, an operation status or a photo.
+        """
+        path, params = self.get_query()
+        if path.startswith('/photo/'):
+            return self.send_body(200, self.server.photo_bytes,
+                                  'image/jpeg')
+        if self.server.should_fail():
+            return self.send_json(503, {'error': 'ServiceUnavailable'})
+        if path.endswith('/resources/upload'):
+            return self.send_json(200, {
+                'href': f'{self.server.url}/target/{params["path"]}',
+                'method': 'PUT'})
+        if '/operations/' in path:
+            status = self.server.get_operation_status(
+                int(path.rpartition('/')[2]))
+            return self.send_json(200, {'status': status})
+        if path.endswith('/resources'):
+            listing = self.server.list_folder(params['path'],
+                                              int(params.get('offset', 0)),
+                                              int(params.get('limit', 20)))
+            if listing is None:
+                return self.send_json(404, {'error': 'DiskNotFoundError'})
+            return self.send_json(200, listing)
+        self.send_json(404, {'error': 'NotFound'})
+
+    def do_PUT(self):
+        """
+        Handle a directory creation or an upload of a file.
+        """
+        path, params = self.get_query()
+        if path.startswith('/target/'):
+            body = self.read_body()
+            self.server.add_file(path[len('/target/'):], len(body))
+            return self.send_body(201, b'')
+        if self.server.should_fail():
+            return self.send_json(503, {'error': 'ServiceUnavailable'})
+        if self.server.add_directory(params['path']):
+            return self.send_json(201, {'href': params['path']})
+        self.send_json(409, {'error': 'DiskPathPointsToExistentDirectoryError',
+                             'message': 'Папка уже существует'})
+
+    def do_POST(self):
+        """
+        Handle an upload of a file by URL.
+        """
+        path, params = self.get_query()
+        if self.server.should_fail():
+            return self.send_json(503, {'error': 'ServiceUnavailable'})
+        operation_id = self.server.add_operation(params['path'])
+        self.send_json(202, {
+            'href': f'{self.server.url}/v1/disk/operations/{operation_id}',
+            'method': 'GET'})
+
+
+class MockYandexServer(MockServer):
+    """
+    A stand-in for the Yandex Disk API.
+
+    Attributes:
+        photo_bytes (bytes): The content of every photo file.
+        operation_delay (float): The time in seconds an upload by URL takes.
+        directories (set): The paths of created directories.
+        files (dict): The sizes of uploaded files by path.
+        operations (dict): The finish time, the file path and whether
+        the upload fails of uploads by URL by operation ID.
+        fetch_failures (dict): The number of next uploads by URL that fail
+        by file path.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0,
+                 operation_delay: float = 0.0, photo_size: int = 100_000,
+                 seed: int = 0):
+        """
+        Initialize the MockYandexServer.
+
+        Args:
+            latency (float, optional): The delay of every response in
+            seconds. Defaults to 0.0.
+            failure_rate (float, optional): The share of API requests that
+            fail with status 503. Defaults to 0.0.
+            operation_delay (float, optional): The time in seconds an upload
+            by URL takes. Defaults to 0.0.
+            photo_size (int, optional): The size of every photo file in
+            bytes. Defaults to 100000.
+            seed (int, optional): The seed of the random generator of
+            failures. Defaults to 0.
+        """
+        super().__init__(YandexHandler, latency, failure_rate, seed)
+        self.photo_bytes = random.Random(seed).randbytes(photo_size)
+        self.operation_delay = operation_delay
+        self.directories = set()
+        self.files = {}
+        self.operations = {}
+        self.fetch_failures = {}
+        self.operation_ids = itertools.count()
+
+    @property
+    def api_url(self) -> str:
+        """
+        Get the URL of the resources API method.
+
+        Returns:
+            str: The URL.
+        """
+        return f'{self.url}/v1/disk/resources'
+
+    def add_directory(self, path: str) -> bool:
+        """
+        Create a directory.
+
+        Args:
+            path (str): The path of the directory.
+
+        Returns:
+            bool: False if the directory already exists.
+        """
+        with self.lock:
+            if path in self.directories:
+                return False
+            self.directories.add(path)
+            return True
+
+    def add_file(self, path: str, size: int):
+        """
+        Store an uploaded file.
+
+        Args:
+            path (str): The path of the file.
+            size (int): The size of the file in bytes.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.files[path] = size
+
+    def add_operation(self, path: str) -> int:
+        """
+        Start an upload by URL.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            int: The operation ID.
+        """
+        with self.lock:
+            operation_id = next(self.operation_ids)
+            failed = self.fetch_failures.get(path, 0) > 0
+            if failed:
+                self.fetch_failures[path] -= 1
+            self.operations[operation_id] = (
+                time.monotonic() + self.operation_delay, path, failed)
+            return operation_id
+
+    def get_operation_status(self, operation_id: int) -> str:
+        """
+        Get the status of an upload by URL.
+
+        Args:
+            operation_id (int): The operation ID.
+
+        Returns:
+            str: 'success', 'failed' or 'in-progress'.
+        """
+        finish_time, path, failed = self.operations[operation_id]
+        if time.monotonic() < finish_time:
+            return 'in-progress'
+        if failed:
+            return 'failed'
+        self.add_file(path, len(self.photo_bytes))
+        return 'success'
+
+    def list_folder(self, path: str, offset: int,
+                    limit: int) -> dict | None:
+        """
+        Get a page of the items of a directory.
+
+        Args:
+            path (str): The path of the directory.
+            offset (int): The offset of the page.
+            limit (int): The number of items on the page.
+
+        Returns:
+            dict | None: The resource object with the '_embedded' items or
+            None if the directory doesn't exist.
+        """
+        with self.lock:
+            if path not in self.directories:
+                return None
+            prefix = f'{path}/'
+            items = [{'name': directory[len(prefix):], 'type': 'dir'}
+                     for directory in sorted(self.directories)
+                     if directory.startswith(prefix) and
+                     '/' not in directory[len(prefix):]]
+            items.extend({'name': file_path[len(prefix):], 'type': 'file',
+                          'md5': ''}
+                         for file_path in sorted(self.files)
+                         if file_path.startswith(prefix) and
+                         '/' not in file_path[len(prefix):])
+        return {'path': f'disk:/{path}', 'type': 'dir',
+                '_embedded': {'items': items[offset:offset + limit],
+                              'offset': offset, 'limit': limit,
+                              'total': len(items)}}
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIRECTORY, os.path.join(ROOT_DIRECTORY, 'benchmarks')]
+
+from mock_servers import MockVKServer, MockYandexServer  # noqa: E402
+from vk_backup import APIYaDiClient, BackupManifest, VKAPIClient  # noqa: E402
+
+
+@pytest.fixture
+def yandex_server():
+    server = MockYandexServer(photo_size = 1000).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_vk_client(yandex_server):
+    servers = []
+
+    def make_vk_client(albums: dict[int, int],
+                       user_id: int = 1) -> VKAPIClient:
+        server = MockVKServer(albums, yandex_server.url).start()
+        servers.append(server)
+        client = VKAPIClient(user_id, 'token')
+        client.API_BASE_URL = f'{server.url}/method/'
+        return client
+
+    make_vk_client.servers = servers
+    yield make_vk_client
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_yadi_client(yandex_server, tmp_path):
+    def make_yadi_client(**kwargs) -> APIYaDiClient:
+        client = APIYaDiClient(
+            'token', 2, result_path = str(tmp_path / 'result.jsonl'),
+            manifest = BackupManifest(str(tmp_path / 'manifest.jsonl')),
+            **kwargs)
+        client.BASE_API_YADI_URL = yandex_server.api_url
+        return client
+
+    return make_yadi_client
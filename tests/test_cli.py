@@ -0,0 +1,11 @@
+import pytest
+
+from vk_backup.cli import run_cli
+
+
+def test_numeric_album_is_rejected_for_several_users(capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        run_cli(['1', '2', '-n', '5', '-d', 'backup', '-a', '123'])
+
+    assert exc_info.value.code == 2
+    assert 'profile, wall или saved' in capsys.readouterr().err
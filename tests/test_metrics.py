@@ -0,0 +1,51 @@
+import requests
+
+from vk_backup import BackupMetrics
+
+
+def test_prometheus_families_are_contiguous():
+    metrics = BackupMetrics()
+    request = requests.Request('PUT', 'http://disk/target/b/1.jpg',
+                               data = b'photo').prepare()
+    for status in (201, 503, 'ReadTimeout'):
+        metrics.record_request(request, status, 0.1, 10, 0)
+    metrics.record_retry(requests.ConnectionError())
+    metrics.record_stage('upload', 1.0)
+
+    families = []
+    for line in metrics.to_prometheus().splitlines():
+        if line.startswith('# TYPE '):
+            families.append(line.split()[2])
+            continue
+        name = line.partition('{')[0]
+        assert name in (families[-1], f'{families[-1]}_sum',
+                        f'{families[-1]}_count')
+
+    assert len(families) == len(set(families)) == 6
+
+
+def test_streamed_body_is_counted(yandex_server):
+    metrics = BackupMetrics()
+    session = requests.Session()
+    metrics.attach(session)
+
+    session.put(f'{yandex_server.url}/target/b/1.jpg',
+                data = iter([b'a' * 100, b'b' * 50])).raise_for_status()
+
+    [stats] = metrics.summary()['requests']
+    assert stats['bytes_sent'] == 150
+
+
+def test_request_failed_without_response_is_recorded():
+    metrics = BackupMetrics()
+    session = requests.Session()
+    metrics.attach(session)
+
+    try:
+        session.get('http://127.0.0.1:1/target', timeout = 1)
+    except requests.RequestException:
+        pass
+
+    [stats] = metrics.summary()['requests']
+    assert stats['status'] == 'ConnectionError'
+    assert stats['count'] == 1
@@ -0,0 +1,56 @@
+import pytest
+
+from vk_backup import PhotoRecord, SizeSelector
+
+
+SIDES = (('s', 75), ('x', 604), ('z', 1280), ('w', 2560))
+
+
+def make_photo(photo_id: int) -> PhotoRecord:
+    sizes = tuple((side, side * 3 // 4, size_type, f'{photo_id}_{size_type}')
+                  for size_type, side in SIDES)
+    return PhotoRecord(photo_id, 1, 0, 0, *sizes[-1], sizes = sizes)
+
+
+def estimate(selector: SizeSelector, photos: list[PhotoRecord]) -> float:
+    return sum(photo.width * photo.height
+               for photo in photos) * selector.bytes_per_pixel
+
+
+@pytest.mark.parametrize('budget', [20_000, 500_000, 2_000_000])
+def test_fit_budget_keeps_estimate_within_budget(budget):
+    selector = SizeSelector('budget', budget = budget)
+    photos = [make_photo(photo_id) for photo_id in range(10)]
+
+    selector.fit_budget(photos)
+
+    assert estimate(selector, photos) <= budget
+    assert len({photo.size_type for photo in photos}) == 1
+
+
+def test_fit_budget_keeps_largest_sizes_when_they_fit():
+    selector = SizeSelector('budget', budget = 10 ** 9)
+    photos = [make_photo(photo_id) for photo_id in range(10)]
+
+    selector.fit_budget(photos)
+
+    assert {photo.size_type for photo in photos} == {'w'}
+
+
+def test_fit_budget_falls_back_to_smallest_sizes():
+    selector = SizeSelector('budget', budget = 1)
+    photos = [make_photo(photo_id) for photo_id in range(3)]
+
+    selector.fit_budget(photos)
+
+    assert {photo.size_type for photo in photos} == {'s'}
+    assert all(photo.url.endswith('_s') for photo in photos)
+
+
+def test_fit_budget_ignores_other_modes():
+    selector = SizeSelector('largest')
+    photos = [make_photo(0)]
+
+    selector.fit_budget(photos)
+
+    assert photos[0].size_type == 'w'
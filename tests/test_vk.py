@@ -0,0 +1,161 @@
+import json
+import os
+import time
+
+import pytest
+
+from vk_backup import (PhotoMetadataCache, VKAPIError, iter_vk_response_events,
+                       run_backup)
+
+
+def split(data: bytes, size: int) -> list[bytes]:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_stream_parser_yields_pages_and_items(chunk_size):
+    items = [{'id': i, 'text': 'фото ]'} for i in range(3)]
+    body = json.dumps({'response': {'count': 3, 'items': items}},
+                      ensure_ascii = False).encode()
+
+    events = list(iter_vk_response_events(split(body, chunk_size)))
+
+    assert events == [('page', 3), *(('item', item) for item in items)]
+
+
+def test_stream_parser_reports_failed_execute_calls():
+    body = json.dumps({'response': [{'count': 1, 'items': [{'id': 1}]},
+                                    False]}).encode()
+
+    events = list(iter_vk_response_events(split(body, 5)))
+
+    assert events == [('page', 1), ('item', {'id': 1}), ('failed', None)]
+
+
+def test_stream_parser_raises_api_error():
+    body = json.dumps({'error': {'error_code': 30,
+                                 'error_msg': 'This profile is private'}})
+
+    with pytest.raises(VKAPIError):
+        list(iter_vk_response_events(split(body.encode(), 3)))
+
+
+def test_stream_parser_raises_on_truncated_page():
+    body = b'{"response": {"count": 2, "items": [{"id": 1}, {"id"'
+
+    with pytest.raises(VKAPIError):
+        list(iter_vk_response_events(split(body, 4)))
+
+
+def test_album_pages_come_from_requested_owner(make_vk_client):
+    client = make_vk_client({1: 10, 2: 1500})
+
+    photos = list(client.iter_album_photos('profile', owner_id = 2))
+
+    assert len(photos) == 1500
+    assert {photo.owner_id for photo in photos} == {2}
+    assert len({photo.id for photo in photos}) == 1500
+
+
+def test_execute_batches_are_bound_by_photo_number(make_vk_client):
+    client = make_vk_client({1: 10, 2: 1500, 3: 10, 4: 10})
+    batch_sizes = []
+    execute_photos_get = client.execute_photos_get
+
+    def record_execute_photos_get(requests_params):
+        batch_sizes.append(len(requests_params))
+        return execute_photos_get(requests_params)
+
+    client.execute_photos_get = record_execute_photos_get
+    client.EXECUTE_MAX_PHOTOS = 2000
+
+    users_albums = client.fetch_users_albums([1, 2, 3, 4], 'profile')
+
+    assert batch_sizes == [2, 2, 1]
+    assert {user_id: len(photos) for user_id, (_, photos)
+            in users_albums.items()} == {1: 10, 2: 1500, 3: 10, 4: 10}
+
+
+def test_execute_batch_is_split_when_response_is_too_big(make_vk_client):
+    client = make_vk_client({1: 10, 2: 20, 3: 30})
+    batch_sizes = []
+    execute_photos_get = client.execute_photos_get
+
+    def execute_photos_get_or_fail(requests_params):
+        batch_sizes.append(len(requests_params))
+        if len(requests_params) > 1:
+            raise VKAPIError({'error_code': 13,
+                              'error_msg': 'response size is too big'})
+        return execute_photos_get(requests_params)
+
+    client.execute_photos_get = execute_photos_get_or_fail
+
+    users_albums = client.fetch_users_albums([1, 2, 3], 'profile')
+
+    assert batch_sizes == [3, 1, 2, 1, 1]
+    assert {user_id: photo_number for user_id, (photo_number, _)
+            in users_albums.items()} == {1: 10, 2: 20, 3: 30}
+
+
+def test_cache_eviction_skips_files_removed_meanwhile(tmp_path, monkeypatch):
+    for name in range(5):
+        (tmp_path / f'{name}.json').write_text('{}')
+    cache = PhotoMetadataCache(str(tmp_path), 60, 2)
+    getatime = os.path.getatime
+
+    def remove_and_getatime(path):
+        if path.endswith('0.json'):
+            os.remove(path)
+        return getatime(path)
+
+    monkeypatch.setattr(os.path, 'getatime', remove_and_getatime)
+    cache.evict()
+
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_single_user_backup_records_vk_fetch(make_vk_client,
+                                             make_yadi_client):
+    vk_client = make_vk_client({1: 3})
+    yadi_client = make_yadi_client(metrics = vk_client.metrics)
+
+    result = run_backup(vk_client, yadi_client, [1], 3, 'b')
+
+    assert len(result) == 3
+    assert vk_client.metrics.stages['vk_fetch']['count'] == 1
+    assert {'upload', 'prepare_upload'} <= set(vk_client.metrics.stages)
+
+
+def test_cache_compares_count_reported_by_vk(make_vk_client, tmp_path,
+                                            monkeypatch):
+    client = make_vk_client({1: 5})
+    server = make_vk_client.servers[-1]
+    get_page = server.get_page
+
+    def get_page_with_hidden_photo(params):
+        page = get_page(params)
+        return {**page, 'count': page['count'] + 1}
+
+    monkeypatch.setattr(server, 'get_page', get_page_with_hidden_photo)
+    client.cache = PhotoMetadataCache(str(tmp_path), ttl = 0)
+    assert len(list(client.iter_cached_album_photos('profile'))) == 5
+    requests_count = server.requests_count
+
+    assert len(list(client.iter_cached_album_photos('profile'))) == 5
+    assert server.requests_count == requests_count + 1
+
+
+def test_cache_refetches_album_older_than_max_age(make_vk_client, tmp_path):
+    client = make_vk_client({1: 5})
+    server = make_vk_client.servers[-1]
+    client.cache = PhotoMetadataCache(str(tmp_path), ttl = 0, max_age = 0.2)
+    list(client.iter_cached_album_photos('profile'))
+    requests_count = server.requests_count
+    list(client.iter_cached_album_photos('profile'))
+    assert server.requests_count == requests_count + 1
+
+    time.sleep(0.3)
+    list(client.iter_cached_album_photos('profile'))
+
+    assert (client.cache.get(1, 'profile')['fetched_at'] >
+            time.time() - 0.2)
@@ -0,0 +1,173 @@
+import time
+
+import pytest
+import requests
+
+from vk_backup import (BackupMetrics, LocalDestination, OperationTracker,
+                       RetryPolicy)
+
+
+def track(tracker: OperationTracker, keys: int,
+          timeout: float = 5) -> dict[int, str]:
+    statuses = {}
+    deadline = time.monotonic() + timeout
+    while len(statuses) < keys and time.monotonic() < deadline:
+        tracker.poll()
+        statuses.update(tracker.collect())
+        time.sleep(0.01)
+    return statuses
+
+
+def test_tracker_reports_final_statuses(yandex_server):
+    yandex_server.operation_delay = 0.2
+    yandex_server.fetch_failures['b/1.jpg'] = 1
+    tracker = OperationTracker(requests.Session(), {}, (5, 5),
+                               poll_interval = 0.05)
+    for key, path in enumerate(('b/0.jpg', 'b/1.jpg')):
+        operation_id = yandex_server.add_operation(path)
+        tracker.add(key, f'{yandex_server.url}/v1/disk/operations/'
+                         f'{operation_id}')
+    try:
+        statuses = track(tracker, 2)
+    finally:
+        tracker.close()
+
+    assert statuses == {0: 'success', 1: 'failed'}
+    assert not tracker.operations and not tracker.pending
+
+
+def test_tracker_poll_does_not_wait_for_statuses(yandex_server):
+    yandex_server.latency = 0.5
+    tracker = OperationTracker(requests.Session(), {}, (5, 5))
+    tracker.add(0, f'{yandex_server.url}/v1/disk/operations/'
+                   f'{yandex_server.add_operation("b/0.jpg")}')
+    try:
+        start = time.monotonic()
+        tracker.poll()
+        assert tracker.collect() == {}
+        assert time.monotonic() - start < 0.25
+        assert track(tracker, 1) == {0: 'success'}
+    finally:
+        tracker.close()
+
+
+def test_tracker_fails_operations_after_timeout(yandex_server):
+    yandex_server.operation_delay = 60
+    tracker = OperationTracker(requests.Session(), {}, (5, 5),
+                               poll_interval = 0.05, operation_timeout = 0.2)
+    tracker.add(0, f'{yandex_server.url}/v1/disk/operations/'
+                   f'{yandex_server.add_operation("b/0.jpg")}')
+    try:
+        assert track(tracker, 1) == {0: 'failed'}
+    finally:
+        tracker.close()
+
+
+def test_upload_retries_failed_fetch(yandex_server, make_vk_client,
+                                     make_yadi_client):
+    photos = list(make_vk_client({1: 1}).iter_album_photos('profile'))
+    yandex_server.fetch_failures['b/0.jpg'] = 1
+
+    result = make_yadi_client().upload_photo(photos, 1, 'b')
+
+    assert [entry['status'] for entry in result] == ['success']
+    assert 'b/0.jpg' in yandex_server.files
+
+
+def test_refetched_photo_is_not_its_own_duplicate(yandex_server,
+                                                  make_vk_client,
+                                                  make_yadi_client):
+    photos = list(make_vk_client({1: 1}).iter_album_photos('profile'))
+    yandex_server.fetch_failures['b/0.jpg'] = 1
+
+    result = make_yadi_client(deduplicate = True).upload_photo(photos, 1,
+                                                               'b')
+
+    assert [entry['status'] for entry in result] == ['success']
+
+
+def test_duplicates_are_detected_by_content(yandex_server, make_vk_client,
+                                            make_yadi_client):
+    photos = list(make_vk_client({1: 3}).iter_album_photos('profile'))
+
+    result = make_yadi_client(deduplicate = True).upload_photo(photos, 3,
+                                                               'b')
+
+    assert sorted(entry['status'] for entry in result) == [
+        'duplicate', 'duplicate', 'success']
+    assert len(yandex_server.files) == 1
+
+
+def test_photo_failing_every_fetch_is_failed(yandex_server, make_vk_client,
+                                             make_yadi_client):
+    photos = list(make_vk_client({1: 1}).iter_album_photos('profile'))
+    yandex_server.fetch_failures['b/0.jpg'] = 10
+
+    result = make_yadi_client().upload_photo(photos, 1, 'b')
+
+    assert [entry['status'] for entry in result] == ['failed']
+
+
+def test_taken_name_is_renamed_unless_manifest_has_photo(
+        yandex_server, make_vk_client, make_yadi_client):
+    photos = list(make_vk_client({1: 1}).iter_album_photos('profile'))
+    yandex_server.add_directory('b')
+    yandex_server.add_file('b/0.jpg', 1)
+
+    first = make_yadi_client().upload_photo(photos, 1, 'b')
+    second = make_yadi_client().upload_photo(photos, 1, 'b')
+
+    assert first[0]['file_name'] != '0.jpg'
+    assert first[0]['status'] == 'success'
+    assert second[0]['status'] == 'skipped'
+
+
+def test_manifest_skips_photos_whose_likes_changed(yandex_server,
+                                                   make_vk_client,
+                                                   make_yadi_client):
+    photos = list(make_vk_client({1: 2}).iter_album_photos('profile'))
+    first = make_yadi_client().upload_photo(photos, 2, 'b')
+    photos[0].likes += 1
+
+    second = make_yadi_client().upload_photo(photos, 2, 'b')
+
+    assert [entry['status'] for entry in second] == ['skipped', 'skipped']
+    assert (sorted(entry['file_name'] for entry in second) ==
+            sorted(entry['file_name'] for entry in first))
+    assert len(yandex_server.files) == 2
+
+
+@pytest.mark.parametrize('failed_request', [1, 2])
+def test_listing_and_directory_requests_are_retried(
+        yandex_server, make_vk_client, make_yadi_client, monkeypatch,
+        failed_request):
+    photos = list(make_vk_client({1: 1}).iter_album_photos('profile'))
+    should_fail = yandex_server.should_fail
+    monkeypatch.setattr(yandex_server, 'should_fail', lambda: (
+        should_fail() or yandex_server.requests_count == failed_request))
+    client = make_yadi_client(retry_policy = RetryPolicy(3, 0.01))
+
+    result = client.upload_photo(photos, 1, 'b')
+
+    assert [entry['status'] for entry in result] == ['success']
+
+
+def test_url_mode_with_mirror_downloads_photo_once(yandex_server,
+                                                   make_vk_client,
+                                                   make_yadi_client,
+                                                   tmp_path):
+    photos = list(make_vk_client({1: 2}).iter_album_photos('profile'))
+    metrics = BackupMetrics()
+    client = make_yadi_client(
+        transfer_mode = 'url', metrics = metrics,
+        mirrors = [LocalDestination(str(tmp_path / 'mirror'))])
+
+    result = client.upload_photo(photos, 2, 'b')
+
+    assert [entry['status'] for entry in result] == ['success', 'success']
+    assert len(yandex_server.files) == 2
+    assert len(list((tmp_path / 'mirror' / 'b').iterdir())) == 2
+    requests_count = {(stats['method'], stats['endpoint']): stats['count']
+                      for stats in metrics.summary()['requests']}
+    assert requests_count[('GET', '/photo/{id}')] == 2
+    assert ('POST', '/v1/disk/resources/upload') not in requests_count
@@ -0,0 +1,84 @@
+"""
+Backup of VK photos to Yandex Disk.
+
+The submodules are imported on first access to their names, so importing
+the package costs nothing, the API clients are imported without tkinter
+and the modules of the graphical user interface are loaded only by
+vk_backup.gui.
+"""
+import importlib
+
+
+_EXPORTS = {
+    'VKAPIError': 'models',
+    'PhotoRecord': 'models',
+    'SizeSelector': 'models',
+    'PhotoScheduler': 'models',
+    'DEFAULT_TIMEOUT': 'network',
+    'TokenBucket': 'network',
+    'RateLimitedAdapter': 'network',
+    'create_session': 'network',
+    'get_rate_limiter': 'network',
+    'RetryPolicy': 'network',
+    'CountingBody': 'metrics',
+    'BackupMetrics': 'metrics',
+    'BackupCallbacks': 'callbacks',
+    'iter_vk_response_events': 'vk',
+    'PhotoMetadataCache': 'vk',
+    'VKAPIClient': 'vk',
+    'OperationTracker': 'yadisk',
+    'RemoteFolderIndex': 'yadisk',
+    'BackupDestination': 'yadisk',
+    'YandexDiskDestination': 'yadisk',
+    'LocalDestination': 'yadisk',
+    'APIYaDiClient': 'yadisk',
+    'RESULT_PATH': 'reports',
+    'ResultWriter': 'reports',
+    'ResultPager': 'reports',
+    'BackupManifest': 'reports',
+    'SETTINGS_PATH': 'settings',
+    'load_settings': 'settings',
+    'create_vk_client': 'settings',
+    'create_yadi_client': 'settings',
+    'create_clients': 'settings',
+    'parse_album_id': 'cli',
+    'run_backup': 'cli',
+    'run_backup_shard': 'cli',
+    'run_sharded_backup': 'cli',
+    'run_cli': 'cli',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    """
+    Import the submodule of an exported name on first access.
+
+    Args:
+        name (str): The name.
+
+    Returns:
+        The value of the name.
+
+    Raises:
+        AttributeError: If the package does not export the name.
+    """
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute '
+                             f'{name!r}')
+    value = getattr(importlib.import_module(f'.{module_name}', __name__),
+                    name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    """
+    List the names of the package, including the ones not imported yet.
+
+    Returns:
+        list[str]: The names.
+    """
+    return sorted({*globals(), *_EXPORTS})
@@ -0,0 +1,92 @@
+# Обратные вызовы для отчета о ходе резервного копирования
+# Callbacks for reporting the backup progress
+
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackupCallbacks:
+    """
+    A receiver of the progress and messages of API clients.
+
+    The default implementation writes them to the log. Front ends, such as
+    the GUI, override the methods they need.
+
+    Attributes:
+        error_count (int): The number of reported errors.
+    """
+
+    def __init__(self):
+        """
+        Initialize the BackupCallbacks.
+        """
+        self.error_count = 0
+
+    def on_start(self, total: int):
+        """
+        Called before the upload of photos starts.
+
+        Args:
+            total (int): The number of photos to upload.
+
+        Returns:
+            None
+        """
+        logger.info('Загрузка %s фотографий', total)
+
+    def on_progress(self, done: int, total: int):
+        """
+        Called every time a photo is processed.
+
+        Args:
+            done (int): The number of processed photos.
+            total (int): The number of photos to upload.
+
+        Returns:
+            None
+        """
+        if done == total or done % max(1, total // 10) == 0:
+            logger.info('Загружено %s из %s фотографий', done, total)
+
+    def on_finish(self, result_report: list[dict]):
+        """
+        Called after the upload of photos is finished.
+
+        Args:
+            result_report (list[dict]): A list of dictionaries containing
+            upload results.
+
+        Returns:
+            None
+        """
+        logger.info('Загрузка завершена')
+
+    def on_info(self, title: str, message: str):
+        """
+        Called to report an informational message.
+
+        Args:
+            title (str): The title of the message.
+            message (str): The text of the message.
+
+        Returns:
+            None
+        """
+        logger.info('%s: %s', title, message)
+
+    def on_error(self, title: str, message: str):
+        """
+        Called to report an error.
+
+        Args:
+            title (str): The title of the error.
+            message (str): The text of the error.
+
+        Returns:
+            None
+        """
+        self.error_count += 1
+        logger.error('%s: %s', title, message)
@@ -0,0 +1,278 @@
+# 4. Резервное копирование без графического интерфейса
+# 4. Backup without the graphical user interface
+
+
+import argparse
+import logging
+import os
+import shutil
+from concurrent.futures import as_completed
+
+from .callbacks import BackupCallbacks
+from .metrics import BackupMetrics
+from .reports import RESULT_PATH, ResultWriter
+from .settings import SETTINGS_PATH, create_clients, load_settings
+from .vk import VKAPIClient
+from .yadisk import APIYaDiClient
+
+
+logger = logging.getLogger(__name__)
+
+SHARDS_PER_PROCESS = 4
+
+
+def parse_album_id(album_id: str) -> int | str | None:
+    """
+    Parse the album ID entered by the user.
+
+    Args:
+        album_id (str): 'profile', 'wall', 'saved' or the ID of an album.
+
+    Returns:
+        int | str | None: The album ID or None if it is not valid.
+    """
+    album_id = album_id.strip()
+    if album_id.lstrip('-').isdigit():
+        return int(album_id)
+    if album_id in ('profile', 'wall', 'saved'):
+        return album_id
+    return None
+
+
+def run_backup(vk_client: VKAPIClient, yadi_client: APIYaDiClient,
+               user_ids: list[int], item_number: int, directory_name: str,
+               album_id: int | str = 'profile',
+               user_directories: bool = False) -> list[dict]:
+    """
+    Back up photos of one or several VK users to Yandex Disk.
+
+    Photos of a single user are streamed from VK straight into the upload,
+    unless user_directories is set. Photos of several users are fetched
+    through shared execute batches and uploaded to subdirectories named
+    after the user IDs.
+
+    Args:
+        vk_client (VKAPIClient): The client of the VK API.
+        yadi_client (APIYaDiClient): The client of the Yandex Disk API.
+        user_ids (list[int]): A list of IDs of VK users.
+        item_number (int): The number of photos of each user to upload.
+        directory_name (str): The name of the directory to upload to.
+        album_id (int | str, optional): The album ID: 'profile', 'wall',
+        'saved' or, for a single user, the ID of the user's album.
+        Defaults to 'profile'.
+        user_directories (bool, optional): Whether to upload photos of
+        a single user to a subdirectory too. Defaults to False.
+
+    Returns:
+        list[dict]: A list of dictionaries containing upload results.
+    """
+    if len(user_ids) == 1 and not user_directories:
+        photos = vk_client.iter_cached_album_photos(album_id, user_ids[0])
+        try:
+            return yadi_client.upload_photo(photos, item_number,
+                                            directory_name)
+        finally:
+            photos.close()
+    photo_sets = vk_client.get_users_photos_sets(user_ids, album_id)
+    failed_user_ids = [str(user_id) for user_id in user_ids
+                       if user_id not in photo_sets]
+    if photo_sets and failed_user_ids:
+        vk_client.callbacks.on_error('Ошибка', 'Не удалось получить '
+                                     'фотографии пользователей: '
+                                     f'{', '.join(failed_user_ids)}')
+    photo_sets = {user_id: photo_set
+                  for user_id, photo_set in photo_sets.items() if photo_set}
+    if not photo_sets:
+        return []
+    return yadi_client.upload_photo_sets(photo_sets, item_number,
+                                         directory_name)
+
+
+def run_backup_shard(settings_path: str, user_ids: list[int],
+                     item_number: int, directory_name: str,
+                     album_id: int | str, result_path: str,
+                     transfer_mode: str | None, rate_share: float
+                     ) -> tuple[list[dict], int, BackupMetrics]:
+    """
+    Back up photos of a part of the users in a worker process, with its
+    own session and its share of the API rate limits.
+
+    Args:
+        settings_path (str): The path of the settings file.
+        user_ids (list[int]): A list of IDs of VK users of the shard.
+        item_number (int): The number of photos of each user to upload.
+        directory_name (str): The name of the directory to upload to.
+        album_id (int | str): The album ID: 'profile', 'wall' or 'saved'.
+        result_path (str): The path of the result report of the shard,
+        in a directory of its own, which is created if needed.
+        transfer_mode (str | None): The transfer mode, if it overrides
+        the settings.
+        rate_share (float): The share of the API rate limits.
+
+    Returns:
+        tuple[list[dict], int, BackupMetrics]: The upload results,
+        the number of reported errors and the metrics of the shard.
+    """
+    os.makedirs(os.path.dirname(result_path), exist_ok = True)
+    settings = load_settings(settings_path, rate_share)
+    callbacks = BackupCallbacks()
+    vk_client, yadi_client = create_clients(settings, user_ids[0],
+                                            callbacks, result_path,
+                                            transfer_mode)
+    result_report = run_backup(vk_client, yadi_client, user_ids,
+                               item_number, directory_name, album_id,
+                               user_directories = True)
+    return result_report, callbacks.error_count, settings['metrics']
+
+
+def run_sharded_backup(settings_path: str, user_ids: list[int],
+                       item_number: int, directory_name: str,
+                       album_id: int | str, processes: int,
+                       result_path: str = RESULT_PATH,
+                       transfer_mode: str | None = None) -> int:
+    """
+    Back up photos of many users in a pool of worker processes.
+
+    The users are split into contiguous shards, SHARDS_PER_PROCESS per
+    process, so a process that finished a shard takes the next one instead
+    of waiting for a process with a large account. Each process gets
+    an equal share of the API rate limits. Every shard writes
+    its report to a numbered directory in the directory result_path
+    without the extension followed by '_shards', so a crash loses no
+    uploads of unfinished shards. The reports and the metrics of the shards
+    are merged into result_path, and the metrics files next to it, as each
+    shard finishes, then the report of the shard is removed. Reports of
+    failed shards are kept.
+
+    Args:
+        settings_path (str): The path of the settings file.
+        user_ids (list[int]): A list of IDs of VK users.
+        item_number (int): The number of photos of each user to upload.
+        directory_name (str): The name of the directory to upload to.
+        album_id (int | str): The album ID: 'profile', 'wall' or 'saved'.
+        processes (int): The number of worker processes.
+        result_path (str, optional): The path of the merged report.
+        Defaults to RESULT_PATH.
+        transfer_mode (str | None, optional): The transfer mode, if it
+        overrides the settings. Defaults to None.
+
+    Returns:
+        int: The number of errors reported by all shards.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    processes = min(processes, len(user_ids))
+    shard_size = -(-len(user_ids) // (processes * SHARDS_PER_PROCESS))
+    shards = [user_ids[i:i + shard_size]
+              for i in range(0, len(user_ids), shard_size)]
+    uploaded_number = 0
+    error_count = 0
+    metrics = BackupMetrics()
+    shard_directory = f'{os.path.splitext(result_path)[0]}_shards'
+    shutil.rmtree(shard_directory, ignore_errors = True)
+    with ProcessPoolExecutor(max_workers = processes) as executor, \
+            ResultWriter(result_path) as result_writer:
+        futures = [executor.submit(
+            run_backup_shard, settings_path, shard, item_number,
+            directory_name, album_id,
+            os.path.join(shard_directory, str(index),
+                         os.path.basename(result_path)),
+            transfer_mode, 1 / processes)
+            for index, shard in enumerate(shards)]
+        shards_by_future = {future: (index, shard) for index, (future, shard)
+                            in enumerate(zip(futures, shards))}
+        for future in as_completed(futures):
+            index, shard = shards_by_future[future]
+            try:
+                shard_report, shard_error_count, shard_metrics = (
+                    future.result())
+            except Exception as e:
+                logger.error('Ошибка обработки пользователей %s-%s: %s',
+                             shard[0], shard[-1], e)
+                error_count += 1
+                continue
+            for report_entry in shard_report:
+                result_writer.write(report_entry)
+            uploaded_number += sum(report_entry['status'] == 'success'
+                                   for report_entry in shard_report)
+            error_count += shard_error_count
+            metrics.merge(shard_metrics)
+            shutil.rmtree(os.path.join(shard_directory, str(index)),
+                          ignore_errors = True)
+    metrics.write(result_path)
+    try:
+        os.rmdir(shard_directory)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning('Отчеты процессов, завершившихся с ошибкой, '
+                       'сохранены в %s', shard_directory)
+    logger.info('Загружено %s фотографий %s пользователей в %s процессах',
+                uploaded_number, len(user_ids), processes)
+    return error_count
+
+
+def run_cli(argv: list[str]) -> int:
+    """
+    Run a backup from the command line without the graphical interface.
+
+    Args:
+        argv (list[str]): The command line arguments without the program
+        name.
+
+    Returns:
+        int: The exit code: 0 on success, 1 if any error was reported,
+        2 if the tokens are missing.
+    """
+    parser = argparse.ArgumentParser(
+        description = 'Резервное копирование фотографий VK на Яндекс.Диск '
+                      'без графического интерфейса')
+    parser.add_argument('user_ids', nargs = '+', type = int,
+                        help = 'ID пользователей VK')
+    parser.add_argument('-n', '--number', type = int, required = True,
+                        help = 'количество фотографий каждого пользователя')
+    parser.add_argument('-d', '--directory', required = True,
+                        help = 'папка на Яндекс.Диске')
+    parser.add_argument('-a', '--album', default = 'profile',
+                        help = 'profile, wall, saved или ID альбома')
+    parser.add_argument('-s', '--settings', default = SETTINGS_PATH,
+                        help = 'файл настроек')
+    parser.add_argument('-r', '--result', default = RESULT_PATH,
+                        help = 'файл отчета о загрузке')
+    parser.add_argument('-t', '--transfer-mode',
+                        choices = APIYaDiClient.TRANSFER_MODES,
+                        help = 'url - Яндекс.Диск скачивает фотографии сам, '
+                               'stream - фотографии передаются через '
+                               'программу')
+    parser.add_argument('-p', '--processes', type = int, default = 1,
+                        help = 'количество процессов для параллельной '
+                               'обработки пользователей')
+    parser.add_argument('-v', '--verbose', action = 'store_true',
+                        help = 'подробный вывод')
+    args = parser.parse_args(argv)
+    album_id = parse_album_id(args.album)
+    if album_id is None:
+        parser.error('Ошибка ввода ID альбома!')
+    user_ids = list(dict.fromkeys(args.user_ids))
+    if isinstance(album_id, int) and len(user_ids) > 1:
+        parser.error('Для нескольких пользователей выберите альбом '
+                     'profile, wall или saved!')
+    logging.basicConfig(level = logging.DEBUG if args.verbose
+                        else logging.INFO,
+                        format = '%(asctime)s %(levelname)s %(message)s')
+    settings = load_settings(args.settings)
+    if not settings['vk_token'] or not settings['yadi_token']:
+        logger.error('Ошибка ввода токена!')
+        return 2
+    if args.processes > 1 and len(user_ids) > 1:
+        error_count = run_sharded_backup(
+            args.settings, user_ids, args.number, args.directory, album_id,
+            args.processes, args.result, args.transfer_mode)
+        return 1 if error_count else 0
+    callbacks = BackupCallbacks()
+    vk_client, yadi_client = create_clients(settings, user_ids[0],
+                                            callbacks, args.result,
+                                            args.transfer_mode)
+    run_backup(vk_client, yadi_client, user_ids, args.number,
+               args.directory, album_id)
+    return 1 if callbacks.error_count else 0
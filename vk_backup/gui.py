@@ -0,0 +1,568 @@
+# 5. Класс для работы с графическим интерфейсом
+# 5. Class for working with the graphical user interface
+
+
+import queue
+import threading
+import time
+from tkinter import *
+from tkinter import messagebox
+from tkinter.ttk import Progressbar, Combobox
+
+from .callbacks import BackupCallbacks
+from .cli import parse_album_id
+from .models import PhotoRecord
+from .reports import RESULT_PATH, ResultPager
+from .settings import (SETTINGS_PATH, create_vk_client, create_yadi_client,
+                       load_settings)
+
+
+class GUIBackupCallbacks(BackupCallbacks):
+    """
+    A receiver of the progress and messages of API clients that shows them
+    in the graphical user interface.
+
+    Tk widgets may only be changed from the main thread, so events from
+    other threads are put into a queue, which the Tk main loop drains every
+    EVENT_INTERVAL milliseconds. Progress updates received between two
+    drains are merged into one redraw.
+
+    Attributes:
+        EVENT_INTERVAL (int): The interval between drains in milliseconds.
+        app (GUIRequestApplication): The application to show them in.
+        events (queue.Queue): The queue of events from other threads.
+    """
+
+    EVENT_INTERVAL = 100
+
+    def __init__(self, app: 'GUIRequestApplication'):
+        """
+        Initialize the GUIBackupCallbacks and schedule the first drain of
+        the event queue.
+
+        Args:
+            app (GUIRequestApplication): The application to show them in.
+        """
+        super().__init__()
+        self.app = app
+        self.events = queue.Queue()
+        self.app.root.after(self.EVENT_INTERVAL, self.process_events)
+
+    def put_event(self, *event):
+        """
+        Handle an event at once in the main thread or queue it otherwise.
+
+        Args:
+            *event: The name of the event followed by its arguments.
+
+        Returns:
+            None
+        """
+        if threading.current_thread() is threading.main_thread():
+            self.handle_event(event)
+        else:
+            self.events.put(event)
+
+    def handle_event(self, event: tuple):
+        """
+        Show an event in the graphical user interface.
+
+        Args:
+            event (tuple): The name of the event followed by its arguments.
+
+        Returns:
+            None
+        """
+        name, *args = event
+        if name == 'start':
+            self.app.create_progressbar(*args)
+        elif name == 'progress':
+            self.app.start_progressbar(*args)
+        elif name == 'finish':
+            self.app.stop_progressbar()
+        elif name == 'info':
+            messagebox.showinfo(args[0], message = args[1])
+        elif name == 'error':
+            messagebox.showerror(args[0], message = args[1])
+
+    def process_events(self):
+        """
+        Drain the event queue, keeping only the last of consecutive progress
+        updates, and schedule the next drain. The time spent on handling
+        events is recorded as the 'gui_events' stage.
+
+        Returns:
+            None
+        """
+        start = time.perf_counter()
+        handled = False
+        progress = None
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            handled = True
+            if event[0] == 'progress':
+                progress = event
+                continue
+            if progress:
+                self.handle_event(progress)
+                progress = None
+            self.handle_event(event)
+        if progress:
+            self.handle_event(progress)
+        if handled:
+            self.app.settings['metrics'].record_stage(
+                'gui_events', time.perf_counter() - start)
+        self.app.root.after(self.EVENT_INTERVAL, self.process_events)
+
+    def on_start(self, total: int):
+        """
+        Create the progress bar.
+
+        Args:
+            total (int): The number of photos to upload.
+
+        Returns:
+            None
+        """
+        self.put_event('start', total)
+
+    def on_progress(self, done: int, total: int):
+        """
+        Update the progress bar.
+
+        Args:
+            done (int): The number of processed photos.
+            total (int): The number of photos to upload.
+
+        Returns:
+            None
+        """
+        self.put_event('progress', done, total)
+
+    def on_finish(self, result_report: list[dict]):
+        """
+        Stop the progress bar and show the result buttons.
+
+        Args:
+            result_report (list[dict]): A list of dictionaries containing
+            upload results.
+
+        Returns:
+            None
+        """
+        self.put_event('finish')
+
+    def on_info(self, title: str, message: str):
+        """
+        Show an informational message box.
+
+        Args:
+            title (str): The title of the message.
+            message (str): The text of the message.
+
+        Returns:
+            None
+        """
+        self.put_event('info', title, message)
+
+    def on_error(self, title: str, message: str):
+        """
+        Show an error message box.
+
+        Args:
+            title (str): The title of the error.
+            message (str): The text of the error.
+
+        Returns:
+            None
+        """
+        self.error_count += 1
+        self.put_event('error', title, message)
+
+
+class GUIRequestApplication:
+    """
+    A class to manage the graphical user interface for the application.
+
+    Attributes:
+        root (Tk): The root window of the application.
+        settings (dict): The settings returned by load_settings.
+        user_id_entry (str): The entry field for the user ID.
+        album_entry (str): The entry field for the album ID.
+        token_entry (str): The entry field for the access token.
+        photo_number_entry (str): The entry field for the number of photos.
+        resourse_name_entry (str): The entry field for the directory name.
+        photo_data_list (list): A list of photo data.
+        photo_sets (dict): A dictionary mapping the user ID to a list of
+        photo data when several users are requested.
+        photo_counter (int): The counter for photos.
+        callbacks (GUIBackupCallbacks): The receiver of the progress and
+        messages of API clients.
+        progressbar (Progressbar): The progress bar widget.
+        message_text (StringVar): The text variable for the progress message.
+    """
+
+    def __init__(self, root: Tk, settings: dict):
+        """
+           Initialize the GUIRequestApplication.
+
+           Args:
+               root (Tk): The root window of the application.
+               settings (dict): The settings returned by load_settings.
+           """
+        self.root = root
+        self.settings = settings
+        self.root.title('Резервная копия фотографий профиля VK')
+        self.root.iconbitmap(r'resourses/icon-sm-gru.ico')
+        self.root.geometry('450x190')
+        self.root.resizable(width = False, height = False)
+        self.root['bg'] = 'blue'
+        self.user_id_entry = ''
+        self.album_entry = ''
+        self.token_entry = ''
+        self.photo_number_entry = ''
+        self.resourse_name_entry = ''
+        self.photo_data_list = []
+        self.photo_sets = {}
+        self.photo_counter = 0
+        self.callbacks = GUIBackupCallbacks(self)
+        self.create_widgets()
+        self.progressbar = None
+        self.message_text = ''
+
+
+    def send_request(self):
+        """
+        Send a request to retrieve  profile photos data from VK.
+
+        Returns:
+            None
+        """
+        user_ids = self.user_id_entry.get().replace(',', ' ').split()
+        if user_ids and all(user_id.isdigit() for user_id in user_ids):
+            user_ids = list(dict.fromkeys(int(user_id)
+                                          for user_id in user_ids))
+        else:
+            return messagebox.showerror(message = 'Ошибка ввода ID '
+                                                  'пользователя!')
+        album_id = parse_album_id(self.album_entry.get())
+        if album_id is None:
+            return messagebox.showerror(message = 'Ошибка ввода ID '
+                                                  'альбома!')
+        token = self.settings['yadi_token']
+        if token and len(user_ids) > 1:
+            self.send_users_request(user_ids, album_id)
+        elif token:
+            vk_client = create_vk_client(self.settings, user_ids[0],
+                                         self.callbacks)
+            photo_set = vk_client.get_photos_set(album_id)
+            if photo_set:
+                self.root.geometry('450x390')
+                self.show_responce_result(photo_set)
+                self.photo_data_list = photo_set
+                self.photo_sets = {}
+            elif photo_set == []:
+                 messagebox.showinfo(message = 'У пользователя нет '
+                                               'фотографий!')
+        else:
+            messagebox.showerror(message = 'Ошибка ввода токена!')
+
+    def send_users_request(self, user_ids: list[int], album_id: int | str):
+        """
+        Send a request to retrieve photos data of several users from VK.
+
+        Args:
+            user_ids (list[int]): A list of IDs of VK users.
+            album_id (int | str): The album ID: 'profile', 'wall' or 'saved'.
+
+        Returns:
+            None
+        """
+        if isinstance(album_id, int):
+            return messagebox.showerror(message = 'Для нескольких '
+                                                  'пользователей выберите '
+                                                  'альбом profile, wall '
+                                                  'или saved!')
+        vk_client = create_vk_client(self.settings, user_ids[0],
+                                     self.callbacks)
+        photo_sets = vk_client.get_users_photos_sets(user_ids, album_id)
+        failed_user_ids = [str(user_id) for user_id in user_ids
+                           if user_id not in photo_sets]
+        if photo_sets and failed_user_ids:
+            messagebox.showerror(message = 'Не удалось получить фотографии '
+                                           'пользователей: '
+                                           f'{', '.join(failed_user_ids)}')
+        photo_sets = {user_id: photo_set
+                      for user_id, photo_set in photo_sets.items()
+                      if photo_set}
+        if photo_sets:
+            self.root.geometry('450x390')
+            self.photo_sets = photo_sets
+            self.show_responce_result(max(photo_sets.values(), key = len),
+                                      len(photo_sets))
+        elif not failed_user_ids:
+            messagebox.showinfo(message = 'У пользователей нет фотографий!')
+
+    def create_widgets(self):
+        """
+        Create the widgets for the graphical user interface.
+
+        Returns:
+            None
+        """
+        self.user_id_label = Label(self.root, text = 'ID пользователей в VK '
+                                   '(через запятую)',
+                                   font = 'Arial 11 bold', bg = 'blue',
+                                   fg = 'white', padx = 10, pady = 10)
+        self.user_id_label.pack()
+
+        self.user_id_entry = Entry(self.root, font = 'Arial 12',
+                                   bg = 'lightblue', fg = 'black', width = 30)
+        self.user_id_entry.pack()
+
+        self.album_label = Label(self.root, text = 'Альбом (profile, wall, '
+                                 'saved или ID альбома)',
+                                 font = 'Arial 10 bold', bg = 'blue',
+                                 fg = 'white', padx = 10, pady = 5)
+        self.album_label.pack()
+
+        self.album_entry = Combobox(self.root, font = 'Arial 12', width = 10,
+                                    values = ('profile', 'wall', 'saved'))
+        self.album_entry.set('profile')
+        self.album_entry.pack()
+
+        self.send_btn = Button(self.root, text ='Отправить запрос',
+                               font = 'Arial 10 bold',
+                               command = self.send_request, foreground = 'blue')
+        self.send_btn.pack(padx = 10, pady = 20)
+
+    def show_responce_result(self, responce_result: list[PhotoRecord],
+                             user_number: int = 1):
+        """
+        Display the result of the request.
+
+        Args:
+            responce_result (list[PhotoRecord]): The result of the request, the
+            largest set of photos for several users.
+            user_number (int, optional): The number of users. Defaults to 1.
+
+        Returns:
+            None
+        """
+        if responce_result:
+            self.photo_counter = len(responce_result)
+
+            if user_number > 1:
+                label_text = (f'У {user_number} пользователей в альбоме '
+                              f'{self.album_entry.get()} до '
+                              f'{self.photo_counter} фотографий.\nСколько '
+                              f'фотографий каждого загрузить на '
+                              f'Яндекс.Диск?')
+            else:
+                label_text = (f'В альбоме {self.album_entry.get()} '
+                              f'{self.photo_counter} '
+                              f'фотографий.\nСколько фотографий загрузить '
+                              f'на Яндекс.Диск?')
+            self.responce_label = Label(self.root, text=label_text,
+                                        font='Arial 10 bold', bg='blue',
+                                        fg='white', padx=10, pady=10)
+            self.responce_label.pack()
+
+            self.photo_number_entry = Entry(self.root, font = 'Arial 12',
+                                            bg = 'lightblue', fg = 'black',
+                                            width = 5)
+            self.photo_number_entry.pack()
+
+            self.resourse_name_label = Label(self.root, text = 'Введите имя '
+                                             'папки', font='Arial 10 bold',
+                                             bg='blue', fg='white',
+                                             padx=10, pady=10)
+            self.resourse_name_label.pack()
+
+            self.resourse_name_entry = Entry(self.root, font = 'Arial 12',
+                                             bg = 'lightblue', fg = 'black',
+                                             width = 30)
+            self.resourse_name_entry.pack()
+
+            self.upload_btn = Button(self.root, text = 'Загрузить',
+                                     font = 'Arial 10 bold',
+                                     foreground = 'blue',
+                                     command = self.start_upload_photo)
+            self.upload_btn.pack(padx = 10, pady = 10)
+
+    def start_upload_photo(self):
+        """
+        Start the photo upload process and creates a separate thread for
+        downloading photo
+
+        Returns:
+            None
+        """
+        item_number = self.photo_number_entry.get()
+        if item_number and item_number.isdigit():
+            item_number = int(item_number)
+            if item_number <= self.photo_counter:
+                resourse_name = self.resourse_name_entry.get()
+                if resourse_name == '':
+                    messagebox.showerror(message = 'Поле с названием '
+                                                   'директории\nне должно быть пустым!')
+                else:
+                    self.root.geometry('450x490')
+                    yadi_client = create_yadi_client(self.settings,
+                                                     self.callbacks)
+                    if self.photo_sets:
+                        self.thread = threading.Thread(
+                            target = yadi_client.upload_photo_sets,
+                            args = (self.photo_sets, item_number,
+                                    resourse_name))
+                    else:
+                        self.thread = threading.Thread(
+                            target = yadi_client.upload_photo,
+                            args = (self.photo_data_list, item_number,
+                                    resourse_name))
+                    self.thread.start()
+            else:
+                messagebox.showerror(message = 'Количество фотографий больше '
+                                               'чем в альбоме!')
+        else:
+            messagebox.showerror(message='Проверьте правильность заполнения '
+                                 'поля с количеством фотографий!')
+
+    def create_progressbar(self, value: int):
+        """
+        Create a progress bar widget.
+
+        Args:
+            value (int): The maximum value of the progress bar.
+
+        Returns:
+            Progressbar: The created progress bar widget.
+        """
+        self.message_text = StringVar()
+
+        num_label = Label(self.root, font = 'Arial 10 bold',
+                          textvariable = self.message_text,
+                          bg = 'blue', fg = 'white', padx = 10, pady = 10)
+        num_label.pack()
+
+        self.progressbar = Progressbar(self.root, orient = HORIZONTAL,
+                                       length=300, mode = 'determinate',
+                                       maximum = value)
+        self.progressbar.pack(pady = 10)
+
+        return self.progressbar
+
+    def start_progressbar(self, progress: int, counter: int):
+        """
+        Update the progress bar.
+
+        Args:
+            progress (int): The current progress.
+            counter (int): The total number of items.
+
+        Returns:
+            None
+        """
+        self.progressbar['value'] = progress
+        self.message_text.set(f'Загружено {self.progressbar['value']} из'
+                              f' {counter} фотографий')
+
+    def stop_progressbar(self):
+        """
+        Stop and clean up the progress bar and GUI
+
+        Returns:
+            None
+        """
+        self.root.geometry('450x300')
+        self.progressbar.destroy()
+        self.photo_number_entry.destroy()
+        self.resourse_name_entry.destroy()
+        self.resourse_name_label.destroy()
+        self.responce_label.destroy()
+        self.upload_btn.destroy()
+        self.send_btn.destroy()
+        self.message_text.set('Загрузка завершена!')
+
+        result_json_btn = Button(self.root, text = 'Просмотреть\nрезультат',
+                                font = 'Arial 10 bold', foreground = 'blue',
+                                command = self.get_upload_result)
+        result_json_btn.pack(padx = 10, pady = 10)
+
+        close_button = Button(self.root, text = 'Завершить работу?',
+                              font = 'Arial 10 bold', foreground = 'blue',
+                              command = lambda: self.root.destroy())
+        close_button.pack(side = 'bottom', padx = 20, pady = 10)
+
+    def get_upload_result(self):
+        """
+        Display the upload result in a new window page by page.
+
+        Returns:
+            None
+        """
+        pager = ResultPager(RESULT_PATH)
+        try:
+            first_page = pager.read_page(0)
+        except FileNotFoundError:
+            return messagebox.showerror(message = 'Файл не найден')
+        window = Toplevel(self.root)
+        window.title('Результат загрузки')
+        window.geometry('450x400')
+        page_number = IntVar(window, 0)
+        page_text = StringVar(window)
+
+        close_button = Button(window, text = 'Закрыть окно',
+                              command = lambda: window.destroy())
+        close_button.pack(side = 'bottom')
+
+        navigation_frame = Frame(window)
+        navigation_frame.pack(side = 'bottom')
+
+        text_area = Text(window, width = 100, height = 50, font = 'Arial 12')
+        text_area.pack()
+
+        def show_page(number: int, records: list[dict | str]):
+            page_number.set(number)
+            page_text.set(f'Страница {number + 1}')
+            text_area.delete('1.0', END)
+            for record in records:
+                if isinstance(record, dict):
+                    record = '  '.join(str(value)
+                                       for value in record.values())
+                text_area.insert(END, f'{record}\n')
+
+        def change_page(step: int):
+            number = page_number.get() + step
+            if number < 0:
+                return
+            records = pager.read_page(number)
+            if records:
+                show_page(number, records)
+
+        Button(navigation_frame, text = '<',
+               command = lambda: change_page(-1)).pack(side = 'left')
+        Label(navigation_frame, textvariable = page_text).pack(side = 'left')
+        Button(navigation_frame, text = '>',
+               command = lambda: change_page(1)).pack(side = 'left')
+        show_page(0, first_page)
+
+
+def run_gui(settings_path: str = SETTINGS_PATH):
+    """
+    Read the settings and run the graphical user interface.
+
+    Args:
+        settings_path (str, optional): The path of the settings file.
+        Defaults to SETTINGS_PATH.
+
+    Returns:
+        None
+    """
+    settings = load_settings(settings_path)
+    root = Tk()
+    GUIRequestApplication(root, settings)
+    root.mainloop()
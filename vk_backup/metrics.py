@@ -0,0 +1,445 @@
+# Метрики запросов и этапов резервного копирования
+# Metrics of requests and stages of the backup
+
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from urllib.parse import urlparse
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+class CountingBody:
+    """
+    A streamed request body that counts the bytes sent, since its size is
+    not known before it is sent.
+
+    Attributes:
+        chunks (Iterable[bytes]): The chunks of the body.
+        bytes_sent (int): The number of bytes sent so far.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        """
+        Initialize the CountingBody.
+
+        Args:
+            chunks (Iterable[bytes]): The chunks of the body.
+        """
+        self.chunks = chunks
+        self.bytes_sent = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.chunks:
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+
+class BackupMetrics:
+    """
+    Metrics of a backup run: the latency, status, size and retries of HTTP
+    requests and the duration of stages.
+
+    Requests are recorded by a response hook of the sessions passed to
+    attach, requests failed without a response are recorded with the name
+    of the error as the status. Requests are logged one by one as JSON at
+    the DEBUG level. The
+    summary is exported as JSON and in the Prometheus text format.
+
+    Attributes:
+        requests (dict): Aggregated requests, mapping the host, the method,
+        the endpoint and the status to a dictionary with the 'count',
+        the 'latencies' in seconds, the 'bytes_sent', the 'bytes_received'
+        and the 'retries' made by the transport.
+        retries (Counter): The number of retries made by RetryPolicy by
+        the error name.
+        stages (dict): The 'count' and the total 'seconds' by stage name.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self):
+        """
+        Initialize the BackupMetrics.
+        """
+        self.requests = {}
+        self.retries = Counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        """
+        Get the state for pickling, without the lock, so that metrics of
+        worker processes can be sent back to the parent process.
+
+        Returns:
+            dict: The state.
+        """
+        with self.lock:
+            return {'requests': self.requests, 'retries': self.retries,
+                    'stages': self.stages}
+
+    def __setstate__(self, state: dict):
+        """
+        Restore the state after unpickling.
+
+        Args:
+            state (dict): The state.
+
+        Returns:
+            None
+        """
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def merge(self, other: 'BackupMetrics'):
+        """
+        Add the metrics of another run, such as a worker process.
+
+        Args:
+            other (BackupMetrics): The metrics to add.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            for key, other_stats in other.requests.items():
+                stats = self.requests.setdefault(
+                    key, {'count': 0, 'latencies': [], 'bytes_sent': 0,
+                          'bytes_received': 0, 'retries': 0})
+                stats['count'] += other_stats['count']
+                stats['latencies'].extend(other_stats['latencies'])
+                stats['bytes_sent'] += other_stats['bytes_sent']
+                stats['bytes_received'] += other_stats['bytes_received']
+                stats['retries'] += other_stats['retries']
+            self.retries.update(other.retries)
+            for name, other_stage in other.stages.items():
+                stage = self.stages.setdefault(name, {'count': 0,
+                                                      'seconds': 0.0})
+                stage['count'] += other_stage['count']
+                stage['seconds'] += other_stage['seconds']
+
+    def attach(self, session: requests.Session):
+        """
+        Record all requests of a session.
+
+        Args:
+            session (requests.Session): The HTTP session.
+
+        Returns:
+            None
+        """
+        session.hooks['response'].append(self.record_response)
+        session.send = functools.partial(self.send, session.send)
+
+    def send(self, send: Callable[..., requests.Response],
+             request: requests.PreparedRequest,
+             **kwargs) -> requests.Response:
+        """
+        Send a request of an attached session, counting the bytes of
+        a streamed body and recording the request if it fails without
+        a response.
+
+        Args:
+            send (Callable[..., requests.Response]): The send method of
+            the session.
+            request (requests.PreparedRequest): The request to send.
+            **kwargs: The keyword arguments of requests.Session.send.
+
+        Returns:
+            requests.Response: The response.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        if (request.body is not None and
+                not isinstance(request.body, (bytes, str, CountingBody)) and
+                not hasattr(request.body, 'read')):
+            request.body = CountingBody(request.body)
+        start = time.perf_counter()
+        try:
+            return send(request, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.record_request(request, type(e).__name__,
+                                time.perf_counter() - start, 0, 0)
+            raise
+
+    @staticmethod
+    def get_endpoint(url: str) -> str:
+        """
+        Get the path of a URL with segments containing digits, such as IDs
+        and file names, replaced by '{id}', so that requests to the same API
+        method or file storage are aggregated together. API versions like
+        'v1' are kept.
+
+        Args:
+            url (str): The URL of a request.
+
+        Returns:
+            str: The endpoint.
+        """
+        return re.sub(r'/(?!v\d+(?:/|$))[^/]*\d[^/]*', '/{id}',
+                      urlparse(url).path)
+
+    def record_response(self, response: requests.Response, *args,
+                        **kwargs):
+        """
+        Record a request when its response is received.
+
+        Args:
+            response (requests.Response): The response.
+            *args: The arguments of the hook.
+            **kwargs: The keyword arguments of the hook.
+
+        Returns:
+            None
+        """
+        retry_history = getattr(getattr(response.raw, 'retries', None),
+                                'history', ())
+        self.record_request(
+            response.request, response.status_code,
+            response.elapsed.total_seconds(),
+            int(response.headers.get('Content-Length') or 0),
+            len(retry_history))
+
+    def record_request(self, request: requests.PreparedRequest,
+                       status: int | str, latency: float,
+                       bytes_received: int, retries: int):
+        """
+        Record a request.
+
+        Args:
+            request (requests.PreparedRequest): The request.
+            status (int | str): The status of the response or the name of
+            the error if the request failed without a response.
+            latency (float): The latency in seconds.
+            bytes_received (int): The size of the response body.
+            retries (int): The number of retries made by the transport.
+
+        Returns:
+            None
+        """
+        body = request.body
+        if isinstance(body, CountingBody):
+            bytes_sent = body.bytes_sent
+        else:
+            bytes_sent = len(body) if isinstance(body, (bytes, str)) else 0
+        host = urlparse(request.url).hostname
+        endpoint = self.get_endpoint(request.url)
+        with self.lock:
+            stats = self.requests.setdefault(
+                (host, request.method, endpoint, status),
+                {'count': 0, 'latencies': [], 'bytes_sent': 0,
+                 'bytes_received': 0, 'retries': 0})
+            stats['count'] += 1
+            stats['latencies'].append(latency)
+            stats['bytes_sent'] += bytes_sent
+            stats['bytes_received'] += bytes_received
+            stats['retries'] += retries
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('http_request %s', json.dumps({
+                'host': host, 'method': request.method,
+                'endpoint': endpoint, 'status': status,
+                'latency': latency, 'bytes_sent': bytes_sent,
+                'bytes_received': bytes_received, 'retries': retries}))
+
+    def record_retry(self, error: Exception):
+        """
+        Record a retry of a call after an error.
+
+        Args:
+            error (Exception): The error of the call.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.retries[type(error).__name__] += 1
+
+    def record_stage(self, name: str, seconds: float):
+        """
+        Add the duration of a stage.
+
+        Args:
+            name (str): The name of the stage.
+            seconds (float): The duration in seconds.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            stage = self.stages.setdefault(name, {'count': 0,
+                                                  'seconds': 0.0})
+            stage['count'] += 1
+            stage['seconds'] += seconds
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measure the duration of a stage.
+
+        Args:
+            name (str): The name of the stage.
+
+        Yields:
+            None
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def iter_stage(self, name: str, items: Iterator) -> Iterator:
+        """
+        Measure the time an iterator spends producing its items as
+        a stage, not counting the time the consumer spends between them.
+        The stage is recorded when the iterator is exhausted or closed.
+
+        Args:
+            name (str): The name of the stage.
+            items (Iterator): The iterator.
+
+        Yields:
+            The items of the iterator.
+        """
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                yield item
+        finally:
+            close = getattr(items, 'close', None)
+            if close:
+                close()
+            self.record_stage(name, seconds)
+
+    @classmethod
+    def get_quantiles(cls, latencies: list[float]) -> dict[float, float]:
+        """
+        Get the QUANTILES of latencies.
+
+        Args:
+            latencies (list[float]): The latencies in seconds.
+
+        Returns:
+            dict[float, float]: The latency by quantile.
+        """
+        ordered = sorted(latencies)
+        return {quantile: ordered[min(len(ordered) - 1,
+                                      int(quantile * len(ordered)))]
+                for quantile in cls.QUANTILES}
+
+    def summary(self) -> dict:
+        """
+        Summarize the metrics.
+
+        Returns:
+            dict: A dictionary with the list of 'requests' aggregated by
+            the host, the method, the endpoint and the status, the 'retries'
+            by error name and the 'stages'.
+        """
+        with self.lock:
+            requests_summary = []
+            for (host, method, endpoint, status), stats in sorted(
+                    self.requests.items(), key = lambda item: str(item[0])):
+                quantiles = self.get_quantiles(stats['latencies'])
+                requests_summary.append({
+                    'host': host, 'method': method, 'endpoint': endpoint,
+                    'status': status, 'count': stats['count'],
+                    'latency_sum': sum(stats['latencies']),
+                    'latency_p50': quantiles[0.5],
+                    'latency_p90': quantiles[0.9],
+                    'latency_p99': quantiles[0.99],
+                    'bytes_sent': stats['bytes_sent'],
+                    'bytes_received': stats['bytes_received'],
+                    'retries': stats['retries']})
+            return {'requests': requests_summary,
+                    'retries': dict(self.retries),
+                    'stages': {name: dict(stage)
+                               for name, stage in self.stages.items()}}
+
+    def to_prometheus(self) -> str:
+        """
+        Export the metrics in the Prometheus text format, every metric
+        family as one block under its TYPE line.
+
+        Returns:
+            str: The metrics.
+        """
+        summary = self.summary()
+        request_labels = [
+            (f'host="{stats["host"]}",method="{stats["method"]}",'
+             f'endpoint="{stats["endpoint"]}",status="{stats["status"]}"',
+             stats)
+            for stats in summary['requests']]
+        lines = ['# TYPE backup_http_request_duration_seconds summary']
+        for labels, stats in request_labels:
+            for quantile in self.QUANTILES:
+                lines.append(
+                    f'backup_http_request_duration_seconds{{{labels},'
+                    f'quantile="{quantile}"}} '
+                    f'{stats[f"latency_p{round(quantile * 100)}"]}')
+            lines.extend([
+                f'backup_http_request_duration_seconds_sum{{{labels}}} '
+                f'{stats["latency_sum"]}',
+                f'backup_http_request_duration_seconds_count{{{labels}}} '
+                f'{stats["count"]}'])
+        for name, key in (
+                ('backup_http_request_bytes_sent_total', 'bytes_sent'),
+                ('backup_http_request_bytes_received_total',
+                 'bytes_received'),
+                ('backup_http_transport_retries_total', 'retries')):
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{{{labels}}} {stats[key]}'
+                         for labels, stats in request_labels)
+        lines.append('# TYPE backup_retries_total counter')
+        for error_name, count in summary['retries'].items():
+            lines.append(f'backup_retries_total{{error="{error_name}"}} '
+                         f'{count}')
+        lines.append('# TYPE backup_stage_duration_seconds summary')
+        for name, stage in summary['stages'].items():
+            lines.extend([
+                f'backup_stage_duration_seconds_sum{{stage="{name}"}} '
+                f'{stage["seconds"]}',
+                f'backup_stage_duration_seconds_count{{stage="{name}"}} '
+                f'{stage["count"]}'])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, result_path: str):
+        """
+        Save the summary as metrics.json and metrics.prom in the directory
+        of the result report and log the duration of stages.
+
+        Args:
+            result_path (str): The path of the result report.
+
+        Returns:
+            None
+        """
+        directory = os.path.dirname(result_path)
+        with open(os.path.join(directory, 'metrics.json'), 'w',
+                  encoding = 'utf-8') as f:
+            json.dump(self.summary(), f, indent = 2)
+        with open(os.path.join(directory, 'metrics.prom'), 'w',
+                  encoding = 'utf-8') as f:
+            f.write(self.to_prometheus())
+        for name, stage in self.summary()['stages'].items():
+            logger.info('Этап %s: %.2f с', name, stage['seconds'])
@@ -0,0 +1,301 @@
+# Данные фотографий VK и правила их выбора
+# VK photo data and the rules of choosing photos
+
+
+import bisect
+import heapq
+from collections.abc import Iterable
+from dataclasses import dataclass
+from itertools import islice
+
+
+class VKAPIError(Exception):
+    """
+    An error returned by the VK API in the body of a response.
+
+    Attributes:
+        error_code (int): The VK API error code.
+        error_msg (str): The VK API error message.
+    """
+
+    def __init__(self, error: dict):
+        """
+        Initialize the VKAPIError.
+
+        Args:
+            error (dict): The 'error' object of the VK API response.
+        """
+        self.error_code = error.get('error_code', 0)
+        self.error_msg = error.get('error_msg', '')
+        super().__init__(self.error_msg)
+
+
+@dataclass(slots = True)
+class PhotoRecord:
+    """
+    Metadata of a VK photo needed for the backup.
+
+    Attributes:
+        id (int): The ID of the photo.
+        owner_id (int): The ID of the photo owner.
+        likes (int): The number of likes.
+        date (int): The Unix timestamp of the publication.
+        width (int): The width of the selected size variant.
+        height (int): The height of the selected size variant.
+        size_type (str): The type of the selected size variant.
+        url (str): The URL of the selected size variant.
+        sizes (tuple): The (width, height, type, url) candidates of
+        the size variants, kept only to fit a byte budget.
+    """
+
+    id: int
+    owner_id: int
+    likes: int
+    date: int
+    width: int
+    height: int
+    size_type: str
+    url: str
+    sizes: tuple = ()
+
+
+class SizeSelector:
+    """
+    A policy of choosing the size variant of a photo to back up.
+
+    The variants are compared by pixel area. Old photos have zero width
+    and height, their area is estimated by the nominal side of the size
+    type from NOMINAL_SIDES.
+
+    Attributes:
+        MODES (tuple): 'largest' for the variant of the largest area,
+        'closest' for the variant closest to the target resolution,
+        'budget' for the largest variants that fit in the byte budget of
+        the run.
+        NOMINAL_SIDES (dict): The maximum side in pixels of VK size types.
+        mode (str): The selection mode.
+        target_width (int): The target width for the 'closest' mode.
+        target_height (int): The target height for the 'closest' mode.
+        budget (int): The total number of bytes of a run in the 'budget'
+        mode.
+        bytes_per_pixel (float): The estimated size of a JPEG pixel in
+        bytes.
+    """
+
+    MODES = ('largest', 'closest', 'budget')
+    NOMINAL_SIDES = {'s': 75, 'm': 130, 'o': 130, 'p': 200, 'q': 320,
+                     'r': 510, 'x': 604, 'y': 807, 'z': 1080, 'w': 2560}
+
+    def __init__(self, mode: str = 'largest', target_width: int = 1280,
+                 target_height: int = 1024, budget: int = 0,
+                 bytes_per_pixel: float = 0.25):
+        """
+        Initialize the SizeSelector.
+
+        Args:
+            mode (str, optional): The selection mode. Defaults to 'largest'.
+            target_width (int, optional): The target width for the 'closest'
+            mode. Defaults to 1280.
+            target_height (int, optional): The target height for
+            the 'closest' mode. Defaults to 1024.
+            budget (int, optional): The total number of bytes of a run in
+            the 'budget' mode. Defaults to 0.
+            bytes_per_pixel (float, optional): The estimated size of a JPEG
+            pixel in bytes. Defaults to 0.25.
+
+        Raises:
+            ValueError: If the mode is unknown or the 'budget' mode has no
+            budget.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f'Неизвестный способ выбора размера: {mode}')
+        if mode == 'budget' and budget <= 0:
+            raise ValueError('Не задан объем загрузки для выбора размера')
+        self.mode = mode
+        self.target_width = target_width
+        self.target_height = target_height
+        self.budget = budget
+        self.bytes_per_pixel = bytes_per_pixel
+
+    @property
+    def key(self) -> str:
+        """
+        Get the key of the policy, which separates photo records selected
+        by different policies in the metadata cache.
+
+        Returns:
+            str: The key of the policy.
+        """
+        if self.mode == 'closest':
+            return f'closest_{self.target_width}x{self.target_height}'
+        return self.mode
+
+    def get_area(self, width: int, height: int, size_type: str) -> int:
+        """
+        Get the pixel area of a size variant.
+
+        Args:
+            width (int): The width of the variant.
+            height (int): The height of the variant.
+            size_type (str): The type of the variant.
+
+        Returns:
+            int: The area in pixels.
+        """
+        if width and height:
+            return width * height
+        return self.NOMINAL_SIDES.get(size_type, 0) ** 2
+
+    def select(self, sizes: list[dict]) -> dict:
+        """
+        Select a size variant of a photo.
+
+        In the 'budget' mode the largest variant is selected, fit_budget
+        replaces it once the photos of the run are known.
+
+        Args:
+            sizes (list[dict]): The 'sizes' of a raw VK photo object.
+
+        Returns:
+            dict: The selected size variant.
+        """
+        if self.mode == 'closest':
+            target_area = self.target_width * self.target_height
+            return min(sizes, key = lambda size: abs(
+                self.get_area(size['width'], size['height'], size['type'])
+                - target_area))
+        return max(sizes, key = lambda size: self.get_area(
+            size['width'], size['height'], size['type']))
+
+    def fit_budget(self, photos: list[PhotoRecord]):
+        """
+        Select the size variants of the photos of a run to fit in the byte
+        budget in the 'budget' mode.
+
+        Every photo gets its largest variant not larger than a common area
+        limit, or its smallest variant. The largest limit at which
+        the estimated total fits in the budget is found by binary search.
+
+        Args:
+            photos (list[PhotoRecord]): The photos of the run, changed in
+            place.
+
+        Returns:
+            None
+        """
+        if self.mode != 'budget' or not photos:
+            return
+        candidates = []
+        for photo in photos:
+            variants = sorted(photo.sizes or [(photo.width, photo.height,
+                                               photo.size_type, photo.url)],
+                              key = lambda variant:
+                              self.get_area(*variant[:3]))
+            candidates.append(([self.get_area(*variant[:3])
+                                for variant in variants], variants))
+
+        def choose(limit: int) -> list[int]:
+            return [max(0, bisect.bisect_right(areas, limit) - 1)
+                    for areas, _ in candidates]
+
+        limits = sorted({area for areas, _ in candidates for area in areas})
+        low, high = 0, len(limits) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            total = sum(areas[index] for (areas, _), index
+                        in zip(candidates, choose(limits[middle])))
+            if total * self.bytes_per_pixel <= self.budget:
+                low = middle
+            else:
+                high = middle - 1
+        for photo, (_, variants), index in zip(photos, candidates,
+                                               choose(limits[low])):
+            (photo.width, photo.height, photo.size_type,
+             photo.url) = variants[index]
+
+
+class PhotoScheduler:
+    """
+    A priority order of photos to upload.
+
+    The most valuable photos of an album are taken by a heap of the size of
+    the upload, so a large album is never sorted as a whole, and they are
+    uploaded first, so an interrupted run keeps the most valuable photos.
+
+    Attributes:
+        KEYS (tuple): 'likes' for the most liked photos, 'date' for
+        the newest photos, 'resolution' for the photos of the largest
+        selected size variant, 'album' for the order of the album.
+        key (str): The priority key.
+    """
+
+    KEYS = ('likes', 'date', 'resolution', 'album')
+
+    def __init__(self, key: str = 'likes'):
+        """
+        Initialize the PhotoScheduler.
+
+        Args:
+            key (str, optional): The priority key. Defaults to 'likes'.
+
+        Raises:
+            ValueError: If the key is unknown.
+        """
+        if key not in self.KEYS:
+            raise ValueError(f'Неизвестный порядок загрузки: {key}')
+        self.key = key
+
+    def get_priority(self, photo: PhotoRecord) -> tuple[int, int]:
+        """
+        Get the priority of a photo, newer photos go first on ties.
+
+        Args:
+            photo (PhotoRecord): The photo record.
+
+        Returns:
+            tuple[int, int]: The priority, the larger the earlier.
+        """
+        if self.key == 'likes':
+            return photo.likes, photo.date
+        if self.key == 'resolution':
+            return (photo.width * photo.height or
+                    SizeSelector.NOMINAL_SIDES.get(photo.size_type, 0) ** 2,
+                    photo.date)
+        return photo.date, photo.id
+
+    def top(self, photo_data_list: Iterable[PhotoRecord], number: int
+            ) -> list[PhotoRecord]:
+        """
+        Take the photos of the highest priority.
+
+        Args:
+            photo_data_list (Iterable[PhotoRecord]): A list or an iterator of
+            photo records, consumed once.
+            number (int): The number of photos to take.
+
+        Returns:
+            list[PhotoRecord]: The photos in the order of priority.
+        """
+        if self.key == 'album':
+            return list(islice(photo_data_list, number))
+        return heapq.nlargest(number, photo_data_list,
+                              key = self.get_priority)
+
+    def order(self, photos: list[PhotoRecord], upload_jobs: list[tuple]
+              ) -> list[tuple]:
+        """
+        Order upload jobs of photos of several sets by priority.
+
+        Args:
+            photos (list[PhotoRecord]): The photos of the jobs.
+            upload_jobs (list[tuple]): The upload jobs in the order of
+            photos.
+
+        Returns:
+            list[tuple]: The upload jobs in the order of priority.
+        """
+        if self.key == 'album':
+            return upload_jobs
+        return [upload_job for _, upload_job in sorted(
+            zip(photos, upload_jobs), reverse = True,
+            key = lambda pair: self.get_priority(pair[0]))]
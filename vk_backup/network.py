@@ -0,0 +1,377 @@
+# Общая HTTP-сессия для клиентов API
+# Shared HTTP session for API clients
+
+
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import BackupMetrics
+from .models import VKAPIError
+
+
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class TokenBucket:
+    """
+    A token bucket limiting the rate of requests, which lowers the rate
+    when the server reports that requests are too frequent and slowly
+    restores it afterwards.
+
+    Attributes:
+        max_rate (float): The maximum number of requests per second.
+        rate (float): The current number of requests per second.
+        capacity (float): The maximum number of requests sent at once.
+        tokens (float): The number of requests that can be sent now.
+        updated (float): The monotonic time of the last update of tokens.
+    """
+
+    MIN_RATE_FACTOR = 0.1
+    RECOVERY_FACTOR = 0.1
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        Initialize the TokenBucket.
+
+        Args:
+            rate (float): The maximum number of requests per second.
+            capacity (float, optional): The maximum number of requests sent
+            at once. Defaults to 1.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Wait until a request can be sent and take a token for it.
+
+        Returns:
+            None
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens +
+                                  (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def slow_down(self):
+        """
+        Halve the rate, but not below MIN_RATE_FACTOR of the maximum rate.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.rate = max(self.max_rate * self.MIN_RATE_FACTOR,
+                            self.rate / 2)
+
+    def speed_up(self):
+        """
+        Raise the rate by RECOVERY_FACTOR of the maximum rate.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.rate = min(self.max_rate,
+                            self.rate + self.max_rate * self.RECOVERY_FACTOR)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    A transport adapter that sends requests to each host no faster than
+    its token bucket allows.
+
+    Attributes:
+        limiters (dict): The token buckets by host name. Requests to other
+        hosts are not limited.
+    """
+
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, rate_limits: dict[str, float] | None = None,
+                 **kwargs):
+        """
+        Initialize the RateLimitedAdapter.
+
+        Args:
+            rate_limits (dict[str, float] | None, optional): The maximum
+            number of requests per second by host name. Defaults to None.
+            **kwargs: The arguments of HTTPAdapter.
+        """
+        self.limiters = {host: TokenBucket(rate)
+                         for host, rate in (rate_limits or {}).items()}
+        super().__init__(**kwargs)
+
+    def get_limiter(self, url: str) -> TokenBucket | None:
+        """
+        Get the token bucket of the host of a URL.
+
+        Args:
+            url (str): The URL of a request.
+
+        Returns:
+            TokenBucket | None: The token bucket or None if the host is not
+            limited.
+        """
+        return self.limiters.get(urlparse(url).hostname)
+
+    def send(self, request: requests.PreparedRequest, *args,
+             **kwargs) -> requests.Response:
+        """
+        Send a request after taking a token of its host. Responses with
+        status 429 or 503 lower the rate of the host, others raise it.
+
+        Args:
+            request (requests.PreparedRequest): The request to send.
+            *args: The arguments of HTTPAdapter.send.
+            **kwargs: The keyword arguments of HTTPAdapter.send.
+
+        Returns:
+            requests.Response: The response.
+        """
+        limiter = self.get_limiter(request.url)
+        if limiter:
+            limiter.acquire()
+        response = super().send(request, *args, **kwargs)
+        if limiter and response.status_code in self.THROTTLE_STATUSES:
+            limiter.slow_down()
+        elif limiter:
+            limiter.speed_up()
+        return response
+
+
+def create_session(pool_size: int = 10, max_retries: int = 3,
+                   backoff_factor: float = 0.5,
+                   rate_limits: dict[str, float] | None = None
+                   ) -> requests.Session:
+    """
+    Create an HTTP session with a keep-alive connection pool, retries and
+    per-host rate limits.
+
+    Only failed connections are retried by the transport, since such
+    requests never reach the host. Responses with status 429 and 5xx are
+    left to RetryPolicy, so every repeated request takes a token of its host
+    and retries are not multiplied by two layers.
+
+    Args:
+        pool_size (int, optional): The number of kept-alive connections per
+        host. Defaults to 10.
+        max_retries (int, optional): The number of retries of a failed
+        connection. Defaults to 3.
+        backoff_factor (float, optional): The base of exponential backoff
+        between retries in seconds. Defaults to 0.5.
+        rate_limits (dict[str, float] | None, optional): The maximum number
+        of requests per second by host name. Defaults to None.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(total = max_retries, connect = max_retries, read = 0,
+                  status = 0, other = 0, backoff_factor = backoff_factor,
+                  backoff_jitter = backoff_factor, allowed_methods = None,
+                  raise_on_status = False)
+    adapter = RateLimitedAdapter(rate_limits, pool_connections = pool_size,
+                                 pool_maxsize = pool_size,
+                                 max_retries = retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_rate_limiter(session: requests.Session,
+                     url: str) -> TokenBucket | None:
+    """
+    Get the token bucket of the host of a URL in a session.
+
+    Args:
+        session (requests.Session): The HTTP session.
+        url (str): The URL of a request.
+
+    Returns:
+        TokenBucket | None: The token bucket or None if the host is not
+        limited.
+    """
+    adapter = session.get_adapter(url)
+    if isinstance(adapter, RateLimitedAdapter):
+        return adapter.get_limiter(url)
+    return None
+
+
+class RetryPolicy:
+    """
+    A schedule of retries of failed API calls with exponential backoff and
+    full jitter.
+
+    Transient errors are connection errors, timeouts, HTTP errors with
+    status 429, 500, 502, 503 and 504 and VK API errors 6 (too many
+    requests per second) and 10 (internal server error), which VK returns
+    in responses with status 200.
+
+    Attributes:
+        max_retries (int): The number of retries of a call.
+        backoff_factor (float): The base of exponential backoff in seconds.
+        max_delay (float): The maximum delay between retries in seconds.
+        metrics (BackupMetrics | None): The metrics that count retries.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    VK_RETRY_CODES = (6, 10)
+
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.5,
+                 max_delay: float = 30,
+                 metrics: BackupMetrics | None = None):
+        """
+        Initialize the RetryPolicy.
+
+        Args:
+            max_retries (int, optional): The number of retries of a call.
+            Defaults to 3.
+            backoff_factor (float, optional): The base of exponential
+            backoff in seconds. Defaults to 0.5.
+            max_delay (float, optional): The maximum delay between retries
+            in seconds. Defaults to 30.
+            metrics (BackupMetrics | None, optional): The metrics that count
+            retries. Defaults to None.
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_delay = max_delay
+        self.metrics = metrics
+
+    def is_transient(self, error: Exception) -> bool:
+        """
+        Check whether an error may disappear if the call is repeated.
+
+        Args:
+            error (Exception): The error of the call.
+
+        Returns:
+            bool: True if the error is transient.
+        """
+        if isinstance(error, VKAPIError):
+            return error.error_code in self.VK_RETRY_CODES
+        if isinstance(error, requests.HTTPError):
+            return (error.response is not None and
+                    error.response.status_code in self.RETRY_STATUSES)
+        return isinstance(error, (requests.ConnectionError,
+                                  requests.Timeout,
+                                  requests.exceptions.ChunkedEncodingError))
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        """
+        Check whether a failed call should be repeated.
+
+        Args:
+            error (Exception): The error of the call.
+            attempt (int): The number of retries already made.
+
+        Returns:
+            bool: True if the call should be repeated.
+        """
+        return attempt < self.max_retries and self.is_transient(error)
+
+    def get_delay(self, attempt: int, error: Exception | None = None
+                  ) -> float:
+        """
+        Get a random delay before a retry, at least the Retry-After time
+        of the response, if any.
+
+        Args:
+            attempt (int): The number of retries already made.
+            error (Exception | None, optional): The error of the call.
+            Defaults to None.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = random.uniform(0, min(self.max_delay,
+                                      self.backoff_factor * 2 ** attempt))
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                delay = max(delay, min(self.max_delay, float(
+                    response.headers.get('Retry-After', 0))))
+            except ValueError:
+                pass
+        return delay
+
+    def call(self, func, *args, limiter: TokenBucket | None = None,
+             **kwargs):
+        """
+        Call a function, repeating it after transient errors.
+
+        Args:
+            func (Callable): The function to call.
+            *args: The arguments of the function.
+            limiter (TokenBucket | None, optional): The token bucket to slow
+            down on VK API error 6. Defaults to None.
+            **kwargs: The keyword arguments of the function.
+
+        Returns:
+            Any: The result of the function.
+
+        Raises:
+            Exception: The last error of the function if it is not
+            transient or retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except (requests.RequestException, VKAPIError) as e:
+                if not self.should_retry(e, attempt):
+                    raise
+                self.wait(attempt, e, limiter)
+                attempt += 1
+
+    def wait(self, attempt: int, error: Exception,
+             limiter: TokenBucket | None = None):
+        """
+        Sleep before a retry, slowing down the token bucket if VK reported
+        too many requests per second.
+
+        Args:
+            attempt (int): The number of retries already made.
+            error (Exception): The error of the call.
+            limiter (TokenBucket | None, optional): The token bucket of
+            the host. Defaults to None.
+
+        Returns:
+            None
+        """
+        if (limiter and isinstance(error, VKAPIError) and
+                error.error_code == 6):
+            limiter.slow_down()
+        self.record_retry(error)
+        time.sleep(self.get_delay(attempt, error))
+
+    def record_retry(self, error: Exception):
+        """
+        Count a retry in the metrics, if any.
+
+        Args:
+            error (Exception): The error of the call.
+
+        Returns:
+            None
+        """
+        if self.metrics:
+            self.metrics.record_retry(error)
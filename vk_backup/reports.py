@@ -0,0 +1,235 @@
+# 3. Класс для учета загруженных фотографий
+# 3. Class for keeping track of uploaded photos
+
+
+import datetime
+import json
+import os
+import threading
+import time
+
+
+RESULT_PATH = r'files/result.jsonl'
+
+
+class ResultWriter:
+    """
+    An append-only JSONL writer of the result report. Every record is
+    flushed to the file at once and synced to disk at least every
+    fsync_interval seconds, so a crash loses no finished uploads.
+
+    Attributes:
+        path (str): The path of the report file.
+        fsync_interval (float): The maximum time in seconds between syncs.
+        last_sync (float): The monotonic time of the last sync.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 1.0):
+        """
+        Initialize the ResultWriter and truncate the report file.
+
+        Args:
+            path (str): The path of the report file.
+            fsync_interval (float, optional): The maximum time in seconds
+            between syncs. Defaults to 1.0.
+        """
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.file = open(path, 'w', encoding = 'utf-8', buffering = 1)
+        self.last_sync = time.monotonic()
+        self.lock = threading.Lock()
+
+    def write(self, entry: dict):
+        """
+        Append a record to the report.
+
+        Args:
+            entry (dict): The report entry.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii = False) + '\n')
+            if time.monotonic() - self.last_sync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_sync = time.monotonic()
+
+    def close(self):
+        """
+        Sync and close the report file.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ResultPager:
+    """
+    A lazy reader of a JSONL result report page by page. Only the pages
+    that were viewed are read, the file offsets of their starts are kept
+    to go back.
+
+    Attributes:
+        path (str): The path of the report file.
+        page_size (int): The number of records per page.
+        page_offsets (list[int]): The file offsets of the known pages.
+    """
+
+    def __init__(self, path: str, page_size: int = 100):
+        """
+        Initialize the ResultPager.
+
+        Args:
+            path (str): The path of the report file.
+            page_size (int, optional): The number of records per page.
+            Defaults to 100.
+        """
+        self.path = path
+        self.page_size = page_size
+        self.page_offsets = [0]
+
+    def read_page(self, number: int) -> list[dict | str]:
+        """
+        Read a page of the report.
+
+        Args:
+            number (int): The page number, starting from 0. It may be at
+            most one more than the last page read.
+
+        Returns:
+            list[dict | str]: The records of the page. Lines that are not
+            valid JSON are returned as strings.
+
+        Raises:
+            OSError: If the file can't be read.
+        """
+        records = []
+        with open(self.path, 'rb') as f:
+            f.seek(self.page_offsets[number])
+            while len(records) < self.page_size:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    records.append(line.decode('utf-8', 'replace').strip())
+            if number + 1 == len(self.page_offsets) and records:
+                self.page_offsets.append(f.tell())
+        return records
+
+
+class BackupManifest:
+    """
+    An append-only JSONL log of uploaded photos used to resume backups.
+
+    Records are looked up by the photo ID and the target directory, since
+    file names are built from likes, which change between runs.
+
+    Attributes:
+        path (str): The path of the manifest file.
+        records (dict): The last record for each pair of the photo ID and
+        the directory on Yandex Disk.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the BackupManifest and load existing records.
+
+        Args:
+            path (str): The path of the manifest file.
+        """
+        self.path = path
+        self.records = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Load records from the manifest file, skipping a line truncated by
+        an interrupted run.
+
+        Returns:
+            None
+        """
+        try:
+            with open(self.path, encoding = 'utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[(record['photo_id'], record['path']
+                                  .rpartition('/')[0])] = record
+        except FileNotFoundError:
+            pass
+
+    def get_uploaded_path(self, photo_id: int, directory: str) -> str | None:
+        """
+        Get the path the photo has been uploaded to in the directory or
+        found to be a duplicate at.
+
+        Args:
+            photo_id (int): The ID of the VK photo.
+            directory (str): The path of the directory on Yandex Disk.
+
+        Returns:
+            str | None: The path of the file or None if the photo has not
+            been uploaded to the directory.
+        """
+        record = self.records.get((photo_id, directory))
+        if record is None or record['status'] not in ('uploaded',
+                                                       'duplicate'):
+            return None
+        return record['path']
+
+    def is_uploaded(self, photo_id: int, path: str) -> bool:
+        """
+        Check whether the photo has already been uploaded to the directory
+        of the path, under any name, or found to be a duplicate of a file
+        in it.
+
+        Args:
+            photo_id (int): The ID of the VK photo.
+            path (str): The path of the file on Yandex Disk.
+
+        Returns:
+            bool: True if the photo has been uploaded.
+        """
+        return self.get_uploaded_path(photo_id,
+                                      path.rpartition('/')[0]) is not None
+
+    def add(self, photo_id: int, path: str, status: str):
+        """
+        Append a record about the photo to the manifest file.
+
+        Args:
+            photo_id (int): The ID of the VK photo.
+            path (str): The path of the file on Yandex Disk.
+            status (str): The upload status: 'uploaded', 'duplicate' or
+            'failed'.
+
+        Returns:
+            None
+        """
+        record = {'photo_id': photo_id, 'path': path, 'status': status,
+                  'date': datetime.datetime.now().isoformat(
+                      timespec = 'seconds')}
+        with self.lock:
+            self.records[(photo_id, path.rpartition('/')[0])] = record
+            with open(self.path, 'a', encoding = 'utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii = False) + '\n')
@@ -0,0 +1,181 @@
+# Настройки и создание клиентов API
+# Settings and creation of API clients
+
+
+import os
+from urllib.parse import urlparse
+
+from .callbacks import BackupCallbacks
+from .metrics import BackupMetrics
+from .models import PhotoScheduler, SizeSelector
+from .network import RetryPolicy, create_session
+from .reports import RESULT_PATH, BackupManifest
+from .vk import PhotoMetadataCache, VKAPIClient
+from .yadisk import APIYaDiClient, LocalDestination
+
+
+SETTINGS_PATH = r'files/settings.ini'
+
+
+def load_settings(path: str = SETTINGS_PATH,
+                  rate_share: float = 1.0) -> dict:
+    """
+    Read the settings file and create the objects shared by API clients.
+
+    Args:
+        path (str, optional): The path of the settings file. Defaults to
+        SETTINGS_PATH.
+        rate_share (float, optional): The share of the API rate limits
+        given to this process. Defaults to 1.0.
+
+    Returns:
+        dict: A dictionary with the tokens 'vk_token' and 'yadi_token',
+        'max_workers', the HTTP 'session', the 'timeout' of requests,
+        the 'retry_policy', the 'metrics' of the run, which record
+        requests of the session, the 'manifest' of uploaded photos,
+        the 'transfer_mode', the 'deduplicate' flag, the 'if_exists' mode,
+        the 'size_selector' of size variants, the 'scheduler' of uploads,
+        the 'mirrors' photos are written to besides Yandex Disk and
+        the 'cache' of photo metadata, which is None if no cache directory
+        is set.
+    """
+    import configparser
+
+    config = configparser.ConfigParser()
+    config.read(path, encoding = 'utf-8')
+    max_retries = config.getint('Network', 'max_retries', fallback = 3)
+    backoff_factor = config.getfloat('Network', 'backoff_factor',
+                                     fallback = 0.5)
+    rate_limits = {
+        urlparse(VKAPIClient.API_BASE_URL).hostname: config.getfloat(
+            'Network', 'vk_rate_limit', fallback = 3) * rate_share,
+        urlparse(APIYaDiClient.BASE_API_YADI_URL).hostname: config.getfloat(
+            'Network', 'yadi_rate_limit', fallback = 20) * rate_share}
+    metrics = BackupMetrics()
+    session = create_session(
+        config.getint('Network', 'pool_size', fallback = 10),
+        max_retries, backoff_factor,
+        {host: rate for host, rate in rate_limits.items() if rate > 0})
+    metrics.attach(session)
+    size_selector = SizeSelector(
+        config.get('Sizes', 'policy', fallback = 'largest'),
+        config.getint('Sizes', 'target_width', fallback = 1280),
+        config.getint('Sizes', 'target_height', fallback = 1024),
+        int(config.getfloat('Sizes', 'budget_mb', fallback = 0) * 2 ** 20),
+        config.getfloat('Sizes', 'bytes_per_pixel', fallback = 0.25))
+    mirror_directories = config.get('Mirrors', 'local_directories',
+                                    fallback = '')
+    cache_directory = config.get('Cache', 'directory', fallback = '')
+    cache = None
+    if cache_directory:
+        cache = PhotoMetadataCache(
+            os.path.join(cache_directory, size_selector.key),
+            config.getfloat('Cache', 'ttl', fallback = 3600),
+            config.getint('Cache', 'max_entries', fallback = 100),
+            config.getfloat('Cache', 'max_age', fallback = 86400))
+    return {
+        'vk_token': config.get('Tokens', 'vk_token',
+                               fallback = '').strip('\'"'),
+        'yadi_token': config.get('Tokens', 'yadi_token',
+                                 fallback = '').strip('\'"'),
+        'max_workers': config.getint('Upload', 'max_workers', fallback = 4),
+        'session': session,
+        'timeout': (config.getfloat('Network', 'connect_timeout',
+                                    fallback = 5),
+                    config.getfloat('Network', 'read_timeout',
+                                    fallback = 30)),
+        'retry_policy': RetryPolicy(
+            max_retries, backoff_factor,
+            config.getfloat('Network', 'max_retry_delay', fallback = 30),
+            metrics),
+        'metrics': metrics,
+        'manifest': BackupManifest(config.get(
+            'Upload', 'manifest_path', fallback = r'files/manifest.jsonl')),
+        'transfer_mode': config.get('Upload', 'transfer_mode',
+                                    fallback = 'url'),
+        'deduplicate': config.getboolean('Upload', 'deduplicate',
+                                         fallback = False),
+        'if_exists': config.get('Upload', 'if_exists', fallback = 'rename'),
+        'size_selector': size_selector,
+        'scheduler': PhotoScheduler(config.get('Upload', 'priority',
+                                               fallback = 'likes')),
+        'mirrors': [LocalDestination(directory.strip())
+                    for directory in mirror_directories.split(',')
+                    if directory.strip()],
+        'cache': cache,
+    }
+
+
+def create_vk_client(settings: dict, user_id: int,
+                     callbacks: BackupCallbacks) -> VKAPIClient:
+    """
+    Create the VK API client from the settings.
+
+    Args:
+        settings (dict): The settings returned by load_settings.
+        user_id (int): The ID of the VK user.
+        callbacks (BackupCallbacks): The receiver of progress and messages.
+
+    Returns:
+        VKAPIClient: The client of VK.
+    """
+    return VKAPIClient(user_id, settings['vk_token'],
+                       max_workers = settings['max_workers'],
+                       session = settings['session'],
+                       timeout = settings['timeout'],
+                       callbacks = callbacks,
+                       cache = settings['cache'],
+                       retry_policy = settings['retry_policy'],
+                       metrics = settings['metrics'],
+                       size_selector = settings['size_selector'])
+
+
+def create_yadi_client(settings: dict, callbacks: BackupCallbacks,
+                       result_path: str = RESULT_PATH,
+                       transfer_mode: str | None = None) -> APIYaDiClient:
+    """
+    Create the Yandex Disk API client from the settings.
+
+    Args:
+        settings (dict): The settings returned by load_settings.
+        callbacks (BackupCallbacks): The receiver of progress and messages.
+        result_path (str, optional): The path of the result report.
+        Defaults to RESULT_PATH.
+        transfer_mode (str | None, optional): The transfer mode, if it
+        overrides the settings. Defaults to None.
+
+    Returns:
+        APIYaDiClient: The client of Yandex Disk.
+    """
+    return APIYaDiClient(settings['yadi_token'], settings['max_workers'],
+                         settings['session'], settings['timeout'],
+                         settings['manifest'], callbacks, result_path,
+                         transfer_mode or settings['transfer_mode'],
+                         settings['deduplicate'], settings['if_exists'],
+                         settings['retry_policy'], settings['metrics'],
+                         settings['size_selector'], settings['scheduler'],
+                         settings['mirrors'])
+
+
+def create_clients(settings: dict, user_id: int,
+                   callbacks: BackupCallbacks, result_path: str,
+                   transfer_mode: str | None = None
+                   ) -> tuple[VKAPIClient, APIYaDiClient]:
+    """
+    Create the API clients from the settings.
+
+    Args:
+        settings (dict): The settings returned by load_settings.
+        user_id (int): The ID of the VK user.
+        callbacks (BackupCallbacks): The receiver of progress and messages.
+        result_path (str): The path of the result report.
+        transfer_mode (str | None, optional): The transfer mode, if it
+        overrides the settings. Defaults to None.
+
+    Returns:
+        tuple[VKAPIClient, APIYaDiClient]: The clients of VK and Yandex
+        Disk.
+    """
+    return (create_vk_client(settings, user_id, callbacks),
+            create_yadi_client(settings, callbacks, result_path,
+                               transfer_mode))
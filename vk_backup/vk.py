@@ -0,0 +1,1019 @@
+# 1. Класс для работы с API VK
+# 1. Class for working with VK API
+
+
+import codecs
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple
+
+import requests
+
+from .callbacks import BackupCallbacks
+from .metrics import BackupMetrics
+from .models import PhotoRecord, SizeSelector, VKAPIError
+from .network import (DEFAULT_TIMEOUT, RetryPolicy, create_session,
+                      get_rate_limiter)
+from .reports import RESULT_PATH, ResultWriter
+
+
+VK_RESPONSE_TOKEN = re.compile(r'(?P<items>"items"\s*:\s*\[)|'
+                               r'"count"\s*:\s*(?P<count>\d+)\s*[,}]|'
+                               r'(?P<failed>false)(?=\s*[,\]])|'
+                               r'(?P<error>"error"\s*:\s*)|'
+                               r'(?P<execute_errors>"execute_errors"\s*:)')
+
+
+def iter_vk_response_events(chunks: Iterable[bytes]
+                            ) -> Iterator[tuple[str, int | dict | None]]:
+    """
+    Parse a photos.get or execute response of the VK API incrementally.
+
+    Only the objects of "items" arrays are decoded, one at a time, so
+    a response never has to be kept in memory as a whole. The rest of the
+    body is scanned for the numbers of photos and failed calls of execute.
+
+    Args:
+        chunks (Iterable[bytes]): The chunks of the response body.
+
+    Yields:
+        tuple[str, int | dict | None]: ('page', count) when a page starts,
+        ('item', photo) for every raw photo object of the page and
+        ('failed', None) for a failed call of execute.
+
+    Raises:
+        VKAPIError: If the response contains an error or ends in the middle
+        of a page.
+    """
+    json_decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    position = 0
+    in_items = False
+    while True:
+        if in_items:
+            while position < len(buffer) and buffer[position] in ' \r\n\t,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                in_items = False
+                position += 1
+                continue
+            if position < len(buffer):
+                try:
+                    item, position = json_decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    pass
+                else:
+                    yield 'item', item
+                    continue
+        else:
+            match = VK_RESPONSE_TOKEN.search(buffer, position)
+            if match and match.group('error'):
+                buffer += ''.join(text_decoder.decode(chunk)
+                                  for chunk in chunks)
+                error, _ = json_decoder.raw_decode(
+                    buffer[match.end():].lstrip())
+                raise VKAPIError(error)
+            if match and match.group('execute_errors'):
+                return
+            if match:
+                position = match.end()
+                if match.group('items'):
+                    in_items = True
+                elif match.group('count'):
+                    yield 'page', int(match.group('count'))
+                else:
+                    yield 'failed', None
+                continue
+            position = max(position, len(buffer) - 32)
+        chunk = next(chunks, None)
+        if chunk is None:
+            if in_items:
+                raise VKAPIError({'error_msg': 'Ответ VK API оборван'})
+            return
+        buffer = buffer[position:] + text_decoder.decode(chunk)
+        position = 0
+
+
+class PhotoMetadataCache:
+    """
+    A cache of photo records of VK albums kept in memory and on disk.
+
+    Every album is stored in its own JSON file with the time it was
+    fetched. The modification time of the file is the time the album was
+    last fetched or checked to be unchanged and the access time is the time
+    it was last used.
+
+    Attributes:
+        directory (str): The directory of cache files.
+        ttl (float): The time in seconds during which a cached album is
+        used without any requests to VK.
+        max_age (float): The time in seconds after which a cached album is
+        fetched again even if it is unchanged, since the photo URLs of VK
+        expire.
+        max_entries (int): The maximum number of cached albums. The least
+        recently used albums are evicted from memory and disk.
+        entries (OrderedDict): The albums in memory by key, least recently
+        used first.
+    """
+
+    def __init__(self, directory: str, ttl: float = 3600,
+                 max_entries: int = 100, max_age: float = 86400):
+        """
+        Initialize the PhotoMetadataCache.
+
+        Args:
+            directory (str): The directory of cache files.
+            ttl (float, optional): The time in seconds during which a cached
+            album is used without any requests to VK. Defaults to 3600.
+            max_entries (int, optional): The maximum number of cached albums.
+            Defaults to 100.
+            max_age (float, optional): The time in seconds after which
+            a cached album is fetched again even if it is unchanged.
+            Defaults to 86400.
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        os.makedirs(directory, exist_ok = True)
+
+    def get_path(self, owner_id: int, album_id: int | str) -> str:
+        """
+        Get the path of the cache file of an album.
+
+        Args:
+            owner_id (int): The ID of the album owner.
+            album_id (int | str): The album ID.
+
+        Returns:
+            str: The path of the cache file.
+        """
+        return os.path.join(self.directory, f'{owner_id}_{album_id}.json')
+
+    def get(self, owner_id: int, album_id: int | str) -> dict | None:
+        """
+        Get a cached album.
+
+        Args:
+            owner_id (int): The ID of the album owner.
+            album_id (int | str): The album ID.
+
+        Returns:
+            dict | None: A dictionary with the 'fetched_at' and
+            the 'checked_at' timestamps, the 'count' of photos and
+            the 'photos' records of the album, or None if the album is not
+            cached or older than max_age.
+        """
+        path = self.get_path(owner_id, album_id)
+        entry = self.entries.get(path)
+        if entry is None:
+            try:
+                with open(path, encoding = 'utf-8') as f:
+                    data = json.load(f)
+                checked_at = os.path.getmtime(path)
+            except (OSError, ValueError):
+                return None
+            entry = {'fetched_at': data.get('fetched_at', checked_at),
+                     'checked_at': checked_at, 'count': data['count'],
+                     'photos': [PhotoRecord(*fields)
+                                for fields in data['photos']]}
+            self.entries[path] = entry
+            self.evict()
+        if time.time() - entry['fetched_at'] >= self.max_age:
+            return None
+        self.entries.move_to_end(path)
+        try:
+            os.utime(path, (time.time(), entry['checked_at']))
+        except OSError:
+            pass
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """
+        Check whether a cached album was fetched or checked within ttl.
+
+        Args:
+            entry (dict): The cached album returned by get.
+
+        Returns:
+            bool: True if the album can be used without any requests.
+        """
+        return time.time() - entry['checked_at'] < self.ttl
+
+    def put(self, owner_id: int, album_id: int | str, count: int,
+            photos: list[PhotoRecord]):
+        """
+        Store a freshly fetched album.
+
+        Args:
+            owner_id (int): The ID of the album owner.
+            album_id (int | str): The album ID.
+            count (int): The number of photos in the album reported by VK,
+            which later checks compare with, even if fewer photos were
+            returned.
+            photos (list[PhotoRecord]): The photo records of the album.
+
+        Returns:
+            None
+        """
+        path = self.get_path(owner_id, album_id)
+        fetched_at = time.time()
+        data = {'fetched_at': fetched_at, 'count': count,
+                'photos': [astuple(photo) for photo in photos]}
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding = 'utf-8') as f:
+            json.dump(data, f, ensure_ascii = False)
+        os.replace(temp_path, path)
+        self.entries[path] = {'fetched_at': fetched_at,
+                              'checked_at': os.path.getmtime(path),
+                              'count': count, 'photos': photos}
+        self.entries.move_to_end(path)
+        self.evict()
+
+    def touch(self, owner_id: int, album_id: int | str):
+        """
+        Mark a cached album as checked now to be unchanged. The time it was
+        fetched is kept, so it is still fetched again after max_age.
+
+        Args:
+            owner_id (int): The ID of the album owner.
+            album_id (int | str): The album ID.
+
+        Returns:
+            None
+        """
+        path = self.get_path(owner_id, album_id)
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        if path in self.entries:
+            self.entries[path]['checked_at'] = now
+
+    def evict(self):
+        """
+        Remove the least recently used albums from memory and disk. Files
+        removed meanwhile by another process sharing the directory are
+        skipped.
+
+        Returns:
+            None
+        """
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last = False)
+        try:
+            paths = [entry.path for entry in os.scandir(self.directory)
+                     if entry.name.endswith('.json')]
+        except OSError:
+            return
+        access_times = {}
+        for path in paths:
+            try:
+                access_times[path] = os.path.getatime(path)
+            except OSError:
+                pass
+        if len(access_times) > self.max_entries:
+            paths = sorted(access_times, key = access_times.get)
+            for path in paths[:len(paths) - self.max_entries]:
+                self.entries.pop(path, None)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class VKAPIClient:
+    """
+        A class to interact with the VK API.
+
+        Attributes:
+            API_BASE_URL (str): The base URL for VK API methods.
+            access_token (str): The access token for VK API.
+            user_id (int): The ID of the VK user.
+            version (str): The version of the VK API.
+            max_workers (int): The number of concurrent API requests.
+            session (requests.Session): The HTTP session for API requests.
+            timeout (tuple[float, float]): The connect and read timeouts
+            of API requests in seconds.
+            callbacks (BackupCallbacks): The receiver of error messages.
+            cache (PhotoMetadataCache | None): The cache of photo metadata.
+            retry_policy (RetryPolicy): The schedule of retries of calls
+            failed with transient errors.
+            rate_limiter (TokenBucket | None): The token bucket of the VK API
+            host in the session.
+            metrics (BackupMetrics): The metrics of requests and stages.
+            size_selector (SizeSelector): The policy of choosing size
+            variants of photos.
+    """
+
+    API_BASE_URL = 'https://api.vk.com/method/'
+    PAGE_SIZE = 1000
+    EXECUTE_BATCH_SIZE = 25
+    EXECUTE_MAX_PHOTOS = 3000
+    RESPONSE_TOO_BIG_CODE = 13
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+
+    @staticmethod
+    def write_result_to_json(photo_set: list[dict],
+                             path: str = RESULT_PATH):
+        """
+        Write the photo set to a JSONL file, one record per line.
+
+        Args:
+            photo_set (list[dict]): A list of dictionaries containing photo
+            information.
+            path (str, optional): The path of the file. Defaults to
+            RESULT_PATH.
+
+        Returns:
+            None
+        """
+        with ResultWriter(path) as result_writer:
+            for entry in photo_set:
+                result_writer.write(entry)
+
+    @staticmethod
+    def read_result_from_json(path: str = RESULT_PATH) -> list[dict]:
+        """
+        Read the photo set from a JSONL file.
+
+        Args:
+            path (str, optional): The path of the file. Defaults to
+            RESULT_PATH.
+
+        Returns:
+            list[dict]: A list of dictionaries containing photo information.
+        """
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def __init__(self, user_id: int, access_token: str,
+                 version: str = '5.199', max_workers: int = 4,
+                 session: requests.Session | None = None,
+                 timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+                 callbacks: BackupCallbacks | None = None,
+                 cache: PhotoMetadataCache | None = None,
+                 retry_policy: RetryPolicy | None = None,
+                 metrics: BackupMetrics | None = None,
+                 size_selector: SizeSelector | None = None):
+        """
+        Initialize the VKAPIClient.
+
+        Args:
+            user_id (int): The ID of the VK user.
+            access_token (str): The access token for the VK API.
+            version (str, optional): The version of the VK API. Defaults to '5.199'.
+            max_workers (int, optional): The number of concurrent API
+            requests. Defaults to 4.
+            session (requests.Session | None, optional): The HTTP session for
+            API requests. Defaults to a new session from create_session.
+            timeout (tuple[float, float], optional): The connect and read
+            timeouts of API requests in seconds. Defaults to DEFAULT_TIMEOUT.
+            callbacks (BackupCallbacks | None, optional): The receiver of
+            error messages. Defaults to BackupCallbacks, which logs them.
+            cache (PhotoMetadataCache | None, optional): The cache of photo
+            metadata. Defaults to None.
+            retry_policy (RetryPolicy | None, optional): The schedule of
+            retries of failed calls. Defaults to a new RetryPolicy.
+            metrics (BackupMetrics | None, optional): The metrics of requests
+            and stages. Requests are recorded if the session is attached to
+            them or created by the client. Defaults to new BackupMetrics.
+            size_selector (SizeSelector | None, optional): The policy of
+            choosing size variants of photos. Defaults to the largest
+            variant.
+        """
+        self.access_token = access_token
+        self.user_id = user_id
+        self.version = version
+        self.max_workers = max(1, max_workers)
+        self.session = session or create_session()
+        self.timeout = timeout
+        self.callbacks = callbacks or BackupCallbacks()
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = get_rate_limiter(self.session, self.API_BASE_URL)
+        self.metrics = metrics or BackupMetrics()
+        if session is None:
+            self.metrics.attach(self.session)
+        self.size_selector = size_selector or SizeSelector()
+
+    def get_common_params(self) -> dict:
+        """
+        Get common parameters for API requests.
+
+        Returns:
+            dict: A dictionary containing common parameters for API requests.
+        """
+        return {
+            'access_token': self.access_token,
+            'v': self.version
+        }
+
+    def _build_url(self, api_method: str) -> str:
+        """
+        Build the full URL for an API method.
+
+        Args:
+            api_method (str): The API method to be called.
+
+        Returns:
+            str: The full URL for the API method.
+        """
+        return f'{self.API_BASE_URL}/{api_method}'
+
+    def call_api(self, api_method: str, params: dict) -> dict | list:
+        """
+        Call a VK API method, repeating the call after transient errors.
+
+        Args:
+            api_method (str): The API method to be called.
+            params (dict): The parameters of the method, without the common
+            parameters.
+
+        Returns:
+            dict | list: The 'response' object of the VK API response.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error.
+        """
+        return self.retry_policy.call(self.post_api_request, api_method,
+                                      params, limiter = self.rate_limiter)
+
+    def post_api_request(self, api_method: str, params: dict
+                         ) -> dict | list:
+        """
+        Send one request to a VK API method.
+
+        Args:
+            api_method (str): The API method to be called.
+            params (dict): The parameters of the method, without the common
+            parameters.
+
+        Returns:
+            dict | list: The 'response' object of the VK API response.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error.
+        """
+        request_params = self.get_common_params()
+        request_params.update(params)
+        response = self.session.post(self._build_url(api_method),
+                                     data = request_params,
+                                     timeout = self.timeout)
+        response.raise_for_status()
+        response_json = response.json()
+        if 'error' in response_json:
+            raise VKAPIError(response_json['error'])
+        return response_json['response']
+
+    def get_photos_params(self, album_id: int | str, offset: int = 0,
+                          owner_id: int | None = None,
+                          count: int | None = None) -> dict:
+        """
+        Get the parameters of a photos.get request for one page of an album.
+
+        Args:
+            album_id (int | str): The album ID: 'profile', 'wall', 'saved'
+            or the ID of a user's album.
+            offset (int, optional): The offset of the page. Defaults to 0.
+            owner_id (int | None, optional): The ID of the album owner.
+            Defaults to the user of the client.
+            count (int | None, optional): The number of photos on the page.
+            Defaults to PAGE_SIZE.
+
+        Returns:
+            dict: A dictionary containing the parameters of the request.
+        """
+        if owner_id is None:
+            owner_id = self.user_id
+        return {'owner_id': owner_id, 'album_id': album_id,
+                'extended': 1, 'photo_sizes': 1,
+                'count': count or self.PAGE_SIZE, 'offset': offset}
+
+    def call_api_stream(self, api_method: str, params: dict
+                        ) -> Iterator[tuple[str, int | dict | None]]:
+        """
+        Call a photos.get or execute VK API method and parse the response
+        while it is being received.
+
+        Args:
+            api_method (str): The API method to be called.
+            params (dict): The parameters of the method, without the common
+            parameters.
+
+        Yields:
+            tuple[str, int | dict | None]: The events of
+            iter_vk_response_events.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error.
+        """
+        request_params = self.get_common_params()
+        request_params.update(params)
+        with self.session.post(self._build_url(api_method),
+                               data = request_params, timeout = self.timeout,
+                               stream = True) as response:
+            response.raise_for_status()
+            yield from iter_vk_response_events(
+                response.iter_content(self.STREAM_CHUNK_SIZE))
+
+    def parse_photo_item(self, item: dict) -> PhotoRecord:
+        """
+        Convert a raw photo object of the VK API to a photo record, keeping
+        only the size variant chosen by size_selector. In the 'budget' mode
+        all variants are kept as candidates.
+
+        Args:
+            item (dict): The raw photo object.
+
+        Returns:
+            PhotoRecord: The photo record.
+        """
+        size = self.size_selector.select(item['sizes'])
+        sizes = ()
+        if self.size_selector.mode == 'budget':
+            sizes = tuple((variant['width'], variant['height'],
+                           variant['type'], variant['url'])
+                          for variant in item['sizes'])
+        return PhotoRecord(item['id'], item['owner_id'],
+                           item['likes']['count'], item['date'],
+                           size['width'], size['height'], size['type'],
+                           size['url'], sizes)
+
+    def read_pages(self, events: Iterator[tuple[str, int | dict | None]]
+                   ) -> list[tuple[int, list[PhotoRecord]] | bool]:
+        """
+        Collect the events of a response into pages of photo records.
+
+        Args:
+            events (Iterator[tuple[str, int | dict | None]]): The events of
+            iter_vk_response_events.
+
+        Returns:
+            list[tuple[int, list[PhotoRecord]] | bool]: A list of pages,
+            where each page contains the number of photos in the album and
+            the photo records of the page. A failed request is represented
+            by False.
+        """
+        pages = []
+        for event, value in events:
+            if event == 'page':
+                pages.append((value, []))
+            elif event == 'item':
+                pages[-1][1].append(self.parse_photo_item(value))
+            else:
+                pages.append(False)
+        return pages
+
+    def execute_photos_get(self, requests_params: list[dict]
+                           ) -> list[tuple[int, list[PhotoRecord]] | bool]:
+        """
+        Run several photos.get requests in one call of the execute method.
+
+        Args:
+            requests_params (list[dict]): A list of parameters of photos.get
+            requests, one batch of iter_execute_batches.
+
+        Returns:
+            list[tuple[int, list[PhotoRecord]] | bool]: A list of pages in
+            the order of requests_params, see read_pages.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error for the whole call.
+        """
+        calls = ','.join(f'API.photos.get({json.dumps(params)})'
+                         for params in requests_params)
+        pages = self.read_pages(
+            self.call_api_stream('execute', {'code': f'return [{calls}];'}))
+        if len(pages) != len(requests_params):
+            raise VKAPIError({'error_msg': 'Некорректный ответ метода '
+                                           'execute'})
+        return pages
+
+    def iter_execute_batches(self, requests_params: list[dict]
+                             ) -> Iterator[tuple[int, list[PhotoRecord]]
+                                           | bool]:
+        """
+        Run photos.get requests in batches per execute call, max_workers
+        batches at a time.
+
+        A batch has at most EXECUTE_BATCH_SIZE requests for at most
+        EXECUTE_MAX_PHOTOS photos, since every photo comes with the URLs
+        of all its sizes and VK rejects too big responses of execute.
+
+        Args:
+            requests_params (list[dict]): A list of parameters of photos.get
+            requests.
+
+        Yields:
+            tuple[int, list[PhotoRecord]] | bool: The pages in the order of
+            requests_params, see read_pages.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error for the whole call.
+        """
+        batches = []
+        photo_number = 0
+        for params in requests_params:
+            if (not batches or
+                    len(batches[-1]) >= self.EXECUTE_BATCH_SIZE or
+                    photo_number + params['count'] > self.EXECUTE_MAX_PHOTOS):
+                batches.append([])
+                photo_number = 0
+            batches[-1].append(params)
+            photo_number += params['count']
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            for pages in executor.map(self.retry_execute_photos_get,
+                                      batches):
+                yield from pages
+
+    def retry_execute_photos_get(self, requests_params: list[dict]
+                                 ) -> list[tuple[int, list[PhotoRecord]]
+                                           | bool]:
+        """
+        Run execute_photos_get, repeating it after transient errors. If VK
+        reports that the response is too big, the batch is split in halves.
+
+        Args:
+            requests_params (list[dict]): A list of parameters of photos.get
+            requests, one batch of iter_execute_batches.
+
+        Returns:
+            list[tuple[int, list[PhotoRecord]] | bool]: A list of pages in
+            the order of requests_params, see read_pages.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error for the whole call.
+        """
+        try:
+            return self.retry_policy.call(self.execute_photos_get,
+                                          requests_params,
+                                          limiter = self.rate_limiter)
+        except VKAPIError as e:
+            if (e.error_code != self.RESPONSE_TOO_BIG_CODE or
+                    len(requests_params) == 1):
+                raise
+        middle = len(requests_params) // 2
+        return (self.retry_execute_photos_get(requests_params[:middle]) +
+                self.retry_execute_photos_get(requests_params[middle:]))
+
+    def iter_album_photos(self, album_id: int | str,
+                          owner_id: int | None = None
+                          ) -> Iterator[PhotoRecord]:
+        """
+        Retrieve all photos of an album page by page, yielding photo records
+        as soon as they are parsed.
+
+        The first page returns the number of photos in the album, the rest
+        of pages are requested through iter_execute_batches. The first page
+        is requested again after transient errors, already yielded photos
+        are not repeated. The number of photos reported by VK is returned
+        as the value of the generator.
+
+        Args:
+            album_id (int | str): The album ID: 'profile', 'wall', 'saved'
+            or the ID of a user's album.
+            owner_id (int | None, optional): The ID of the album owner.
+            Defaults to the user of the client.
+
+        Yields:
+            PhotoRecord: The photo records without duplicates.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error.
+        """
+        photo_ids = set()
+        photo_number = None
+        attempt = 0
+        while True:
+            try:
+                for event, value in self.call_api_stream(
+                        'photos.get',
+                        self.get_photos_params(album_id,
+                                               owner_id = owner_id)):
+                    if event == 'page':
+                        photo_number = value
+                    elif event == 'item' and value['id'] not in photo_ids:
+                        photo_ids.add(value['id'])
+                        yield self.parse_photo_item(value)
+                break
+            except (requests.RequestException, VKAPIError) as e:
+                if not self.retry_policy.should_retry(e, attempt):
+                    raise
+                self.retry_policy.wait(attempt, e, self.rate_limiter)
+                attempt += 1
+        if photo_number is None:
+            raise VKAPIError({'error_msg': 'Некорректный ответ метода '
+                                           'photos.get'})
+        offsets = range(self.PAGE_SIZE, photo_number, self.PAGE_SIZE)
+        for page in self.iter_execute_batches(
+                [self.get_photos_params(album_id, offset, owner_id)
+                 for offset in offsets]):
+            if not page:
+                raise VKAPIError({'error_msg': 'Ошибка выполнения запроса '
+                                               'photos.get в execute'})
+            for photo in page[1]:
+                if photo.id not in photo_ids:
+                    photo_ids.add(photo.id)
+                    yield photo
+        return photo_number
+
+    def fetch_album_photos(self, album_id: int | str, owner_id: int
+                           ) -> tuple[int, list[PhotoRecord]]:
+        """
+        Retrieve all photos of an album by iter_album_photos.
+
+        Args:
+            album_id (int | str): The album ID: 'profile', 'wall', 'saved'
+            or the ID of a user's album.
+            owner_id (int): The ID of the album owner.
+
+        Returns:
+            tuple[int, list[PhotoRecord]]: The number of photos reported by
+            VK and the photo records without duplicates.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error.
+        """
+        photos = []
+        album_photos = self.iter_album_photos(album_id, owner_id)
+        while True:
+            try:
+                photos.append(next(album_photos))
+            except StopIteration as e:
+                return e.value, photos
+
+    def fetch_users_album_photos(self, user_ids: list[int],
+                                 album_id: int | str
+                                 ) -> dict[int, list[PhotoRecord]]:
+        """
+        Retrieve all photos of an album for several users by
+        fetch_users_albums.
+
+        Args:
+            user_ids (list[int]): A list of IDs of VK users.
+            album_id (int | str): The album ID: 'profile', 'wall' or 'saved'.
+
+        Returns:
+            dict[int, list[PhotoRecord]]: A dictionary mapping the user ID
+            to a list of photo records without duplicates. Users whose photos
+            could not be retrieved are missing from the dictionary.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error for the whole call.
+        """
+        return {user_id: photos for user_id, (_, photos)
+                in self.fetch_users_albums(user_ids, album_id).items()}
+
+    def fetch_users_albums(self, user_ids: list[int], album_id: int | str
+                           ) -> dict[int, tuple[int, list[PhotoRecord]]]:
+        """
+        Retrieve all photos of an album for several users.
+
+        The first pages of all users are requested through
+        iter_execute_batches, then the remaining pages of all users are
+        grouped into shared execute batches.
+
+        Args:
+            user_ids (list[int]): A list of IDs of VK users.
+            album_id (int | str): The album ID: 'profile', 'wall' or 'saved'.
+
+        Returns:
+            dict[int, tuple[int, list[PhotoRecord]]]: A dictionary mapping
+            the user ID to the number of photos reported by VK and a list of
+            photo records without duplicates. Users whose photos could not
+            be retrieved are missing from the dictionary.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error for the whole call.
+        """
+        first_pages = self.iter_execute_batches(
+            [self.get_photos_params(album_id, owner_id = user_id)
+             for user_id in user_ids])
+        users_photos = {}
+        photo_numbers = {}
+        next_pages_owners = []
+        next_pages_params = []
+        for user_id, page in zip(user_ids, first_pages):
+            if not page:
+                continue
+            photo_number, photos = page
+            photo_numbers[user_id] = photo_number
+            users_photos[user_id] = {photo.id: photo for photo in photos}
+            for offset in range(self.PAGE_SIZE, photo_number,
+                                self.PAGE_SIZE):
+                next_pages_owners.append(user_id)
+                next_pages_params.append(
+                    self.get_photos_params(album_id, offset, user_id))
+        next_pages = self.iter_execute_batches(next_pages_params)
+        failed_user_ids = set()
+        for user_id, page in zip(next_pages_owners, next_pages):
+            if not page:
+                failed_user_ids.add(user_id)
+            elif user_id in users_photos:
+                for photo in page[1]:
+                    users_photos[user_id].setdefault(photo.id, photo)
+        return {user_id: (photo_numbers[user_id], list(photos.values()))
+                for user_id, photos in users_photos.items()
+                if user_id not in failed_user_ids}
+
+    def iter_cached_album_photos(self, album_id: int | str,
+                                 owner_id: int | None = None
+                                 ) -> Iterator[PhotoRecord]:
+        """
+        Retrieve all photos of an album through the metadata cache,
+        recording the time spent on them as the vk_fetch stage, without
+        the time the consumer spends between photos.
+
+        Args:
+            album_id (int | str): The album ID: 'profile', 'wall', 'saved'
+            or the ID of a user's album.
+            owner_id (int | None, optional): The ID of the album owner.
+            Defaults to the user of the client.
+
+        Yields:
+            PhotoRecord: The photo records without duplicates.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error.
+        """
+        yield from self.metrics.iter_stage(
+            'vk_fetch', self.iter_album_photos_through_cache(album_id,
+                                                            owner_id))
+
+    def iter_album_photos_through_cache(self, album_id: int | str,
+                                        owner_id: int | None = None
+                                        ) -> Iterator[PhotoRecord]:
+        """
+        Retrieve all photos of an album through the metadata cache.
+
+        A cached album checked within the cache ttl is used as is. An older
+        one is used if a one-photo request shows that the number of photos
+        has not changed. Otherwise, or if the album was fetched more than
+        max_age of the cache ago, it is fetched and cached again.
+        Without a cache the photos are streamed by iter_album_photos.
+
+        Args:
+            album_id (int | str): The album ID: 'profile', 'wall', 'saved'
+            or the ID of a user's album.
+            owner_id (int | None, optional): The ID of the album owner.
+            Defaults to the user of the client.
+
+        Yields:
+            PhotoRecord: The photo records without duplicates.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error.
+        """
+        if owner_id is None:
+            owner_id = self.user_id
+        if not self.cache:
+            yield from self.iter_album_photos(album_id, owner_id)
+            return
+        entry = self.cache.get(owner_id, album_id)
+        if entry and not self.cache.is_fresh(entry):
+            first_page = self.call_api('photos.get', self.get_photos_params(
+                album_id, owner_id = owner_id, count = 1))
+            if first_page['count'] == entry['count']:
+                self.cache.touch(owner_id, album_id)
+            else:
+                entry = None
+        if entry:
+            yield from entry['photos']
+            return
+        photo_number, photos = self.fetch_album_photos(album_id, owner_id)
+        self.cache.put(owner_id, album_id, photo_number, photos)
+        yield from photos
+
+    def fetch_cached_users_album_photos(self, user_ids: list[int],
+                                        album_id: int | str
+                                        ) -> dict[int, list[PhotoRecord]]:
+        """
+        Retrieve all photos of an album for several users through
+        the metadata cache.
+
+        Numbers of photos of users with outdated cached albums are checked
+        with one-photo requests grouped into execute batches, then albums
+        that are missing or changed are fetched by fetch_users_albums.
+
+        Args:
+            user_ids (list[int]): A list of IDs of VK users.
+            album_id (int | str): The album ID: 'profile', 'wall' or 'saved'.
+
+        Returns:
+            dict[int, list[PhotoRecord]]: A dictionary mapping the user ID
+            to a list of photo records. Users whose photos could not be
+            retrieved are missing from the dictionary.
+
+        Raises:
+            requests.RequestException: If the request failed.
+            VKAPIError: If the VK API returned an error for the whole call.
+        """
+        if not self.cache:
+            return self.fetch_users_album_photos(user_ids, album_id)
+        users_photos = {}
+        outdated_entries = {}
+        for user_id in user_ids:
+            entry = self.cache.get(user_id, album_id)
+            if entry and self.cache.is_fresh(entry):
+                users_photos[user_id] = entry['photos']
+            elif entry:
+                outdated_entries[user_id] = entry
+        first_pages = self.iter_execute_batches(
+            [self.get_photos_params(album_id, owner_id = user_id, count = 1)
+             for user_id in outdated_entries])
+        for (user_id, entry), page in zip(outdated_entries.items(),
+                                          first_pages):
+            if page and page[0] == entry['count']:
+                self.cache.touch(user_id, album_id)
+                users_photos[user_id] = entry['photos']
+        fetched_albums = self.fetch_users_albums(
+            [user_id for user_id in user_ids if user_id not in users_photos],
+            album_id)
+        for user_id, (photo_number, photos) in fetched_albums.items():
+            self.cache.put(user_id, album_id, photo_number, photos)
+            users_photos[user_id] = photos
+        return {user_id: users_photos[user_id] for user_id in user_ids
+                if user_id in users_photos}
+
+    def get_photos_set(self, album_id: int | str = 'profile'
+                       ) -> list[PhotoRecord]:
+        """
+        Retrieve the set of photos of an album for the user.
+
+        Args:
+            album_id (int | str, optional): The album ID: 'profile', 'wall',
+            'saved' or the ID of a user's album. Defaults to 'profile'.
+
+        Returns:
+            list[PhotoRecord]: A list of photo records.
+            Returns an empty list if there's an error.
+        """
+        try:
+            return list(self.iter_cached_album_photos(album_id))
+        except requests.RequestException as e:
+            self.callbacks.on_error('Ошибка', f'Ошибка соединения: {e}')
+            return []
+        except VKAPIError as e:
+            self.callbacks.on_error('Ошибка', e.error_msg)
+            return []
+
+    def get_users_photos_sets(self, user_ids: list[int],
+                              album_id: int | str = 'profile'
+                              ) -> dict[int, list[PhotoRecord]]:
+        """
+        Retrieve the sets of photos of an album for several users.
+
+        Args:
+            user_ids (list[int]): A list of IDs of VK users.
+            album_id (int | str, optional): The album ID: 'profile', 'wall'
+            or 'saved'. Defaults to 'profile'.
+
+        Returns:
+            dict[int, list[PhotoRecord]]: A dictionary mapping the user ID
+            to the set of photos. Users whose photos could not be retrieved
+            are missing from the dictionary.
+            Returns an empty dictionary if there's an error.
+        """
+        try:
+            with self.metrics.stage('vk_fetch'):
+                return self.fetch_cached_users_album_photos(user_ids,
+                                                            album_id)
+        except requests.RequestException as e:
+            self.callbacks.on_error('Ошибка', f'Ошибка соединения: {e}')
+            return {}
+        except VKAPIError as e:
+            self.callbacks.on_error('Ошибка', e.error_msg)
+            return {}
+
+    def get_profile_photos_set(self) -> list[PhotoRecord]:
+        """
+        Retrieve the set of profile photos for the user.
+
+        Returns:
+            list[PhotoRecord]: A list of photo records.
+            Returns an empty list if there's an error.
+        """
+        return self.get_photos_set('profile')
@@ -0,0 +1,1450 @@
+# 2. Класс для работы с API ЯндексДиска
+# 2. Class for working with Yandex Disk API
+
+
+import abc
+import contextlib
+import datetime
+import hashlib
+import heapq
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from .callbacks import BackupCallbacks
+from .metrics import BackupMetrics
+from .models import PhotoRecord, PhotoScheduler, SizeSelector, VKAPIError
+from .network import DEFAULT_TIMEOUT, RetryPolicy, create_session
+from .reports import RESULT_PATH, BackupManifest, ResultWriter
+
+
+logger = logging.getLogger(__name__)
+
+
+class OperationTracker:
+    """
+    A class to poll asynchronous operations of Yandex Disk, such as
+    uploading a file by URL.
+
+    Status requests run in the own executor of the tracker, so they are not
+    queued behind upload requests, and their results are collected without
+    blocking the caller.
+
+    Attributes:
+        session (requests.Session): The HTTP session for API requests.
+        headers (dict): The headers of status requests.
+        timeout (tuple[float, float]): The connect and read timeouts of
+        status requests in seconds.
+        executor (ThreadPoolExecutor): The executor for status requests.
+        batch_size (int): The maximum number of operations polled at once.
+        poll_interval (float): The minimum interval between polls in seconds.
+        operation_timeout (float): The time in seconds after which
+        an unfinished operation is considered failed.
+        operations (dict): The tracked operations, mapping the key to the
+        operation URL and the time it was added, oldest polled first.
+        pending (dict): The status requests in progress, mapping the future
+        to the key of the operation.
+    """
+
+    def __init__(self, session: requests.Session, headers: dict,
+                 timeout: tuple[float, float], max_workers: int = 4,
+                 batch_size: int = 50, poll_interval: float = 1.0,
+                 operation_timeout: float = 300):
+        """
+        Initialize the OperationTracker.
+
+        Args:
+            session (requests.Session): The HTTP session for API requests.
+            headers (dict): The headers of status requests.
+            timeout (tuple[float, float]): The connect and read timeouts of
+            status requests in seconds.
+            max_workers (int, optional): The number of concurrent status
+            requests. Defaults to 4.
+            batch_size (int, optional): The maximum number of operations
+            polled at once. Defaults to 50.
+            poll_interval (float, optional): The minimum interval between
+            polls in seconds. Defaults to 1.0.
+            operation_timeout (float, optional): The time in seconds after
+            which an unfinished operation is considered failed.
+            Defaults to 300.
+        """
+        self.session = session
+        self.headers = headers
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers = max(1, max_workers))
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.operation_timeout = operation_timeout
+        self.operations = {}
+        self.pending = {}
+        self.last_poll = 0.0
+
+    def add(self, key: int, href: str):
+        """
+        Start tracking an operation.
+
+        Args:
+            key (int): The key of the operation, such as the upload job index.
+            href (str): The URL of the operation status.
+
+        Returns:
+            None
+        """
+        self.operations[key] = (href, time.monotonic())
+
+    def time_to_next_poll(self) -> float | None:
+        """
+        Get the time left until the next poll.
+
+        Returns:
+            float | None: The time in seconds or None if every tracked
+            operation is being polled.
+        """
+        if len(self.pending) >= len(self.operations):
+            return None
+        return max(0.0, self.last_poll + self.poll_interval -
+                   time.monotonic())
+
+    def get_status(self, href: str) -> str:
+        """
+        Request the status of an operation.
+
+        Args:
+            href (str): The URL of the operation status.
+
+        Returns:
+            str: 'success', 'failed' or 'in-progress'. A failed status request
+            is treated as 'in-progress'.
+        """
+        try:
+            response = self.session.get(href, headers = self.headers,
+                                        timeout = self.timeout)
+            response.raise_for_status()
+            return response.json().get('status', 'in-progress')
+        except (requests.RequestException, ValueError):
+            return 'in-progress'
+
+    def poll(self):
+        """
+        Request the statuses of at most batch_size tracked operations that
+        are not being polled, if poll_interval has passed since the last
+        poll. The results are taken by collect.
+
+        Returns:
+            None
+        """
+        if self.time_to_next_poll() != 0.0:
+            return
+        self.last_poll = time.monotonic()
+        polled_keys = set(self.pending.values())
+        batch = [(key, href) for key, (href, _) in self.operations.items()
+                 if key not in polled_keys][:self.batch_size]
+        for key, href in batch:
+            self.pending[self.executor.submit(self.get_status, href)] = key
+
+    def collect(self) -> dict[int, str]:
+        """
+        Take the results of finished status requests without waiting.
+
+        Returns:
+            dict[int, str]: A dictionary mapping the key of each finished
+            operation to 'success' or 'failed'.
+        """
+        finished = {}
+        for future in [future for future in self.pending if future.done()]:
+            key = self.pending.pop(future)
+            href, added = self.operations[key]
+            status = future.result()
+            if status == 'in-progress':
+                if time.monotonic() - added >= self.operation_timeout:
+                    finished[key] = 'failed'
+            else:
+                finished[key] = status
+            if key in finished:
+                del self.operations[key]
+        return finished
+
+    def close(self):
+        """
+        Stop the status requests.
+
+        Returns:
+            None
+        """
+        self.executor.shutdown(wait = False, cancel_futures = True)
+
+
+class RemoteFolderIndex:
+    """
+    An in-memory index of files and folders on Yandex Disk, built once per
+    run from paginated listings of folders.
+
+    Attributes:
+        session (requests.Session): The HTTP session for API requests.
+        headers (dict): The headers of listing requests.
+        timeout (tuple[float, float]): The connect and read timeouts of
+        listing requests in seconds.
+        base_url (str): The URL of the resources API method.
+        page_size (int): The number of items per listing page.
+        max_workers (int): The number of folders listed concurrently.
+        retry_policy (RetryPolicy): The schedule of retries of listing
+        requests failed with transient errors.
+        folders (dict): The listed folders, mapping the folder path to
+        a dictionary of its items by name. Each item is a dictionary with
+        the 'type' and, for files, the 'md5' hash.
+        hashes (dict): The MD5 hashes of files by folder path.
+    """
+
+    def __init__(self, session: requests.Session, headers: dict,
+                 timeout: tuple[float, float], base_url: str,
+                 page_size: int = 1000, max_workers: int = 4,
+                 retry_policy: RetryPolicy | None = None):
+        """
+        Initialize the RemoteFolderIndex.
+
+        Args:
+            session (requests.Session): The HTTP session for API requests.
+            headers (dict): The headers of listing requests.
+            timeout (tuple[float, float]): The connect and read timeouts of
+            listing requests in seconds.
+            base_url (str): The URL of the resources API method.
+            page_size (int, optional): The number of items per listing page.
+            Defaults to 1000.
+            max_workers (int, optional): The number of folders listed
+            concurrently. Defaults to 4.
+            retry_policy (RetryPolicy | None, optional): The schedule of
+            retries of failed listing requests. Defaults to a new
+            RetryPolicy.
+        """
+        self.session = session
+        self.headers = headers
+        self.timeout = timeout
+        self.base_url = base_url
+        self.page_size = page_size
+        self.max_workers = max(1, max_workers)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.folders = {}
+        self.hashes = {}
+        self.lock = threading.Lock()
+
+    def get_page(self, params: dict) -> requests.Response:
+        """
+        Request a page of the items of a folder.
+
+        Args:
+            params (dict): The parameters of the listing request.
+
+        Returns:
+            requests.Response: The response, with status 404 if the folder
+            doesn't exist.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        response = self.session.get(self.base_url, params = params,
+                                    headers = self.headers,
+                                    timeout = self.timeout)
+        if response.status_code != 404:
+            response.raise_for_status()
+        return response
+
+    def list_folder(self, path: str) -> dict | None:
+        """
+        Request all items of a folder page by page. Pages failed with
+        transient errors are requested again after the delay of
+        retry_policy.
+
+        Args:
+            path (str): The path of the folder.
+
+        Returns:
+            dict | None: A dictionary of items by name or None if
+            the folder doesn't exist.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        items = {}
+        offset = 0
+        while True:
+            params = {'path': path, 'limit': self.page_size,
+                      'offset': offset,
+                      'fields': '_embedded.items.name,_embedded.items.type,'
+                                '_embedded.items.md5,_embedded.total'}
+            response = self.retry_policy.call(self.get_page, params)
+            if response.status_code == 404:
+                return None
+            embedded = response.json().get('_embedded', {})
+            page = embedded.get('items', [])
+            for item in page:
+                items[item['name']] = {'type': item.get('type', 'file'),
+                                       'md5': item.get('md5')}
+            offset += len(page)
+            if not page or offset >= embedded.get('total', 0):
+                return items
+
+    def load(self, path: str):
+        """
+        List a folder into the index.
+
+        Args:
+            path (str): The path of the folder.
+
+        Returns:
+            None
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        items = self.list_folder(path)
+        if items is None:
+            return
+        with self.lock:
+            self.folders[path] = items
+            self.hashes[path] = {item['md5'] for item in items.values()
+                                 if item['md5']}
+
+    def load_folders(self, paths: list[str]):
+        """
+        List several folders into the index concurrently.
+
+        Args:
+            paths (list[str]): The paths of the folders.
+
+        Returns:
+            None
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            list(executor.map(self.load, paths))
+
+    def get_item(self, path: str) -> dict | None:
+        """
+        Get an item of a listed folder.
+
+        Args:
+            path (str): The path of the item.
+
+        Returns:
+            dict | None: The item or None if it is not in the index.
+        """
+        folder, _, name = path.rpartition('/')
+        return self.folders.get(folder, {}).get(name)
+
+    def is_directory(self, path: str) -> bool:
+        """
+        Check whether a folder exists according to the index.
+
+        Args:
+            path (str): The path of the folder.
+
+        Returns:
+            bool: True if the folder exists.
+        """
+        item = self.get_item(path)
+        return path in self.folders or (item is not None and
+                                        item['type'] == 'dir')
+
+    def exists(self, path: str) -> bool:
+        """
+        Check whether a file exists according to the index.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            bool: True if the file exists.
+        """
+        item = self.get_item(path)
+        return item is not None and item['type'] == 'file'
+
+    def get_hashes(self, path: str) -> set:
+        """
+        Get the MD5 hashes of files in a folder.
+
+        Args:
+            path (str): The path of the folder.
+
+        Returns:
+            set: The set of hashes, which the caller may update.
+        """
+        with self.lock:
+            return self.hashes.setdefault(path, set())
+
+    def add_directory(self, path: str):
+        """
+        Add a created folder to the index.
+
+        Args:
+            path (str): The path of the folder.
+
+        Returns:
+            None
+        """
+        folder, _, name = path.rpartition('/')
+        with self.lock:
+            self.folders.setdefault(path, {})
+            if folder in self.folders:
+                self.folders[folder][name] = {'type': 'dir', 'md5': None}
+
+    def add_file(self, path: str, md5: str | None = None):
+        """
+        Add an uploaded file to the index.
+
+        Args:
+            path (str): The path of the file.
+            md5 (str | None, optional): The MD5 hash of the file, if known.
+            Defaults to None.
+
+        Returns:
+            None
+        """
+        folder, _, name = path.rpartition('/')
+        with self.lock:
+            self.folders.setdefault(folder, {})[name] = {'type': 'file',
+                                                         'md5': md5}
+            if md5:
+                self.hashes.setdefault(folder, set()).add(md5)
+
+
+class BackupDestination(abc.ABC):
+    """
+    A destination photos are written to.
+
+    Destinations receive the content of a photo as a stream of chunks, so
+    one download from VK can be written to several destinations at once.
+    """
+
+    @abc.abstractmethod
+    def write_file(self, path: str, chunks: Iterable[bytes]):
+        """
+        Write a file chunk by chunk.
+
+        Args:
+            path (str): The path of the file relative to the root of
+            the destination, with '/' separators.
+            chunks (Iterable[bytes]): The content of the file.
+
+        Returns:
+            The result of the write, specific to the destination.
+
+        Raises:
+            OSError: If the file can't be written.
+        """
+
+
+class YandexDiskDestination(BackupDestination):
+    """
+    Yandex Disk as a destination, written through upload links.
+
+    Attributes:
+        client (APIYaDiClient): The client of the Yandex Disk API.
+        headers (dict): The headers of Yandex Disk API requests.
+    """
+
+    def __init__(self, client: 'APIYaDiClient', headers: dict):
+        """
+        Initialize the YandexDiskDestination.
+
+        Args:
+            client (APIYaDiClient): The client of the Yandex Disk API.
+            headers (dict): The headers of Yandex Disk API requests.
+        """
+        self.client = client
+        self.headers = headers
+
+    def write_file(self, path: str, chunks: Iterable[bytes]
+                   ) -> requests.Response:
+        """
+        Upload a file with chunked transfer encoding.
+
+        Args:
+            path (str): The path of the file on Yandex Disk.
+            chunks (Iterable[bytes]): The content of the file.
+
+        Returns:
+            requests.Response: The response of the upload.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        upload_link = self.client.get_upload_link(path, self.headers)
+        response = self.client.upload_session.put(
+            upload_link, data = iter(chunks), timeout = self.client.timeout)
+        response.raise_for_status()
+        return response
+
+
+class LocalDestination(BackupDestination):
+    """
+    A directory of the local file system or a mounted NAS as a destination.
+
+    A file is written to a '.part' file next to it and renamed when it is
+    complete, so an interrupted write never leaves a truncated photo.
+
+    Attributes:
+        directory (str): The root directory of the backup.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize the LocalDestination.
+
+        Args:
+            directory (str): The root directory of the backup.
+        """
+        self.directory = directory
+
+    def write_file(self, path: str, chunks: Iterable[bytes]) -> str:
+        """
+        Write a file chunk by chunk.
+
+        Args:
+            path (str): The path of the file relative to the directory,
+            with '/' separators.
+            chunks (Iterable[bytes]): The content of the file.
+
+        Returns:
+            str: The path of the written file.
+
+        Raises:
+            OSError: If the file can't be written.
+        """
+        target_path = os.path.join(self.directory, *path.split('/'))
+        os.makedirs(os.path.dirname(target_path), exist_ok = True)
+        part_path = f'{target_path}.part'
+        try:
+            with open(part_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(part_path, target_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(part_path)
+            raise
+        return target_path
+
+
+class APIYaDiClient:
+    """
+    A class to interact with the Yandex Disk API.
+
+    Attributes:
+        BASE_API_YADI_URL (str): The base URL for Yandex Disk API methods.
+        token (str): The access token for Yandex Disk API.
+        max_workers (int): The number of concurrent upload requests.
+        session (requests.Session): The HTTP session for API requests.
+        timeout (tuple[float, float]): The connect and read timeouts of API
+        requests in seconds.
+        manifest (BackupManifest | None): The manifest of uploaded photos.
+        callbacks (BackupCallbacks): The receiver of progress and messages.
+        result_path (str): The path of the result report.
+        transfer_mode (str): 'url' to let Yandex Disk fetch photos by URL,
+        'stream' to stream them from VK through the client. Photos
+        the client downloads anyway, for mirrors or deduplication, are
+        streamed in both modes.
+        upload_session (requests.Session): The HTTP session for streamed
+        uploads, without retries, since a streamed body can't be resent.
+        deduplicate (bool): Whether to skip photos whose content is already
+        in the target directory.
+        if_exists (str): 'skip' to skip photos whose file name is already
+        taken in the target directory, 'rename' to add the date and
+        the photo ID to the name.
+        index (RemoteFolderIndex | None): The index of the target directory
+        of the current upload.
+        retry_policy (RetryPolicy): The schedule of retries of uploads
+        failed with transient errors.
+        metrics (BackupMetrics): The metrics of requests and stages, saved
+        next to the result report.
+        size_selector (SizeSelector): The policy of choosing size variants
+        of uploaded photos.
+        scheduler (PhotoScheduler): The priority order of photos to upload.
+        mirrors (list[BackupDestination]): Other destinations every
+        uploaded photo is written to from the same download as Yandex
+        Disk.
+        fan_out_executor (ThreadPoolExecutor | None): The threads writing
+        a photo to several destinations at once.
+        result_writer (ResultWriter | None): The writer of the result report
+        of the current upload.
+        hash_owners (dict): The MD5 hashes reserved by photos being
+        uploaded with deduplication, by path.
+        upload_counter (int): The counter for uploaded files.
+        same_id_set (set): A set to store IDs of photos with the same likes.
+        same_date_id_set (set): A set to store IDs of photos with the same
+        likes and date.
+    """
+
+    BASE_API_YADI_URL = 'https://cloud-api.yandex.net/v1/disk/resources'
+    FETCH_RETRIES = 2
+    TRANSFER_MODES = ('url', 'stream')
+    IF_EXISTS_MODES = ('skip', 'rename')
+    STREAM_CHUNK_SIZE = 256 * 1024
+    LIST_PAGE_SIZE = 1000
+    FAN_OUT_QUEUE_SIZE = 8
+
+    def __init__(self, token: str, max_workers: int = 4,
+                 session: requests.Session | None = None,
+                 timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+                 manifest: 'BackupManifest | None' = None,
+                 callbacks: BackupCallbacks | None = None,
+                 result_path: str = RESULT_PATH,
+                 transfer_mode: str = 'url',
+                 deduplicate: bool = False, if_exists: str = 'rename',
+                 retry_policy: RetryPolicy | None = None,
+                 metrics: BackupMetrics | None = None,
+                 size_selector: SizeSelector | None = None,
+                 scheduler: PhotoScheduler | None = None,
+                 mirrors: list[BackupDestination] | None = None):
+        """
+        Initialize the APIYaDiClient.
+
+        Args:
+            token (str): The access token for Yandex Disk API.
+            max_workers (int, optional): The number of concurrent upload
+            requests. Defaults to 4.
+            session (requests.Session | None, optional): The HTTP session for
+            API requests. Defaults to a new session from create_session.
+            timeout (tuple[float, float], optional): The connect and read
+            timeouts of API requests in seconds. Defaults to DEFAULT_TIMEOUT.
+            manifest (BackupManifest | None, optional): The manifest of
+            uploaded photos used to skip them. Defaults to None.
+            callbacks (BackupCallbacks | None, optional): The receiver of
+            progress and messages. Defaults to BackupCallbacks, which logs
+            them.
+            result_path (str, optional): The path of the result report.
+            Defaults to RESULT_PATH.
+            transfer_mode (str, optional): 'url' to let Yandex Disk fetch
+            photos by URL, 'stream' to stream them from VK through
+            the client. Defaults to 'url'.
+            deduplicate (bool, optional): Whether to skip photos whose
+            content is already in the target directory. Defaults to False.
+            if_exists (str, optional): 'skip' to skip photos whose file name
+            is already taken in the target directory, 'rename' to add
+            the date and the photo ID to the name. Defaults to 'rename'.
+            retry_policy (RetryPolicy | None, optional): The schedule of
+            retries of failed uploads. Defaults to a new RetryPolicy.
+            metrics (BackupMetrics | None, optional): The metrics of requests
+            and stages. Requests are recorded if the session is attached to
+            them or created by the client. Defaults to new BackupMetrics.
+            size_selector (SizeSelector | None, optional): The policy that
+            fits the size variants of uploaded photos in a byte budget.
+            Defaults to the largest variant.
+            scheduler (PhotoScheduler | None, optional): The priority order
+            of photos to upload. Defaults to the most liked first.
+            mirrors (list[BackupDestination] | None, optional): Other
+            destinations every uploaded photo is written to. Defaults to
+            None.
+
+        Raises:
+            ValueError: If the transfer mode or the if_exists mode is
+            unknown.
+        """
+        self.token = token
+        self.max_workers = max(1, max_workers)
+        self.session = session or create_session()
+        self.timeout = timeout
+        self.manifest = manifest
+        self.callbacks = callbacks or BackupCallbacks()
+        self.result_path = result_path
+        if transfer_mode not in self.TRANSFER_MODES:
+            raise ValueError(f'Неизвестный режим загрузки: {transfer_mode}')
+        self.transfer_mode = transfer_mode
+        self.upload_session = create_session(self.max_workers,
+                                             max_retries = 0)
+        if if_exists not in self.IF_EXISTS_MODES:
+            raise ValueError(f'Неизвестный режим для существующих файлов: '
+                             f'{if_exists}')
+        self.deduplicate = deduplicate
+        self.if_exists = if_exists
+        self.index = None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or BackupMetrics()
+        if session is None:
+            self.metrics.attach(self.session)
+        self.metrics.attach(self.upload_session)
+        self.size_selector = size_selector or SizeSelector()
+        self.scheduler = scheduler or PhotoScheduler()
+        self.mirrors = list(mirrors or ())
+        self.fan_out_executor = None
+        if self.mirrors:
+            self.fan_out_executor = ThreadPoolExecutor(
+                max_workers = self.max_workers * (len(self.mirrors) + 1))
+        self.result_writer = None
+        self.hash_lock = threading.Lock()
+        self.hash_owners = {}
+        self.upload_counter = 0
+        self.same_id_set = set()
+        self.same_date_id_set = set()
+    @staticmethod
+    def get_base_params() -> dict:
+        """
+        Get base parameters for API requests.
+
+        Returns:
+            dict: A dictionary containing base parameters for API requests.
+        """
+        return {}
+
+    @staticmethod
+    def get_base_headers() -> dict:
+        """
+        Get base headers for API requests.
+
+        Returns:
+            dict: A dictionary containing base headers for API requests.
+        """
+        return {
+            'Content-Type': 'application/json'
+        }
+
+    def put_directory(self, dir_name: str) -> tuple[int, str]:
+        """
+        Create a directory on Yandex Disk without notifying the user.
+
+        No request is sent if the remote index shows that the directory
+        already exists. Requests failed with transient errors are sent
+        again after the delay of retry_policy.
+
+        Args:
+            dir_name (str): The name of the directory to be created.
+
+        Returns:
+            tuple[int, str]: The status code of the request and the error
+            message of Yandex Disk, if any.
+        """
+        if self.index and self.index.is_directory(dir_name):
+            return 409, ''
+        headers = self.get_base_headers()
+        headers.update({'Authorization': f'OAuth {self.token}'})
+        params = self.get_base_params()
+        params['path'] = dir_name
+        with self.metrics.stage('create_directory'):
+            try:
+                response = self.retry_policy.call(
+                    self.send_directory_request, params, headers)
+            except requests.HTTPError as e:
+                response = e.response
+        status = response.status_code
+        request_info = response.json()
+        if self.index and status in (201, 409):
+            self.index.add_directory(dir_name)
+        return status, request_info.get('message', '')
+
+    def send_directory_request(self, params: dict, headers: dict
+                               ) -> requests.Response:
+        """
+        Send a request to create a directory.
+
+        Args:
+            params (dict): The parameters of the request with the path of
+            the directory.
+            headers (dict): The headers of the request.
+
+        Returns:
+            requests.Response: The response.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed,
+            including a response with a status that is worth retrying.
+        """
+        response = self.session.put(self.BASE_API_YADI_URL, params = params,
+                                    headers = headers, timeout = self.timeout)
+        if response.status_code in RetryPolicy.RETRY_STATUSES:
+            response.raise_for_status()
+        return response
+
+    def load_remote_index(self, dir_name: str,
+                          subdirectories: list[str] = ()) -> bool:
+        """
+        Build the index of the target directory for the current upload.
+
+        Args:
+            dir_name (str): The name of the target directory.
+            subdirectories (list[str], optional): The paths of
+            subdirectories to list as well, if they exist. Defaults to ().
+
+        Returns:
+            bool: True if the index was built.
+        """
+        headers = self.get_base_headers()
+        headers.update({'Authorization': f'OAuth {self.token}'})
+        self.index = RemoteFolderIndex(self.session, headers, self.timeout,
+                                       self.BASE_API_YADI_URL,
+                                       self.LIST_PAGE_SIZE, self.max_workers,
+                                       self.retry_policy)
+        try:
+            with self.metrics.stage('remote_index'):
+                self.index.load(dir_name)
+                self.index.load_folders([path for path in subdirectories
+                                         if self.index.is_directory(path)])
+        except requests.RequestException as e:
+            self.index = None
+            self.callbacks.on_error('Ошибка', f'Ошибка соединения: {e}')
+            return False
+        return True
+
+    def create_directory(self, dir_name: str) -> int:
+        """
+        Create a directory on Yandex Disk.
+
+        Args:
+            dir_name (str): The name of the directory to be created.
+
+        Returns:
+            int: The status code of the request.
+        """
+        status, message = self.put_directory(dir_name)
+        if status == 201:
+            self.callbacks.on_info(f'Статус запроса: {status}',
+                                   'Папка успешно создана')
+            return status
+        elif status == 409:
+            self.callbacks.on_info(f'Статус запроса: {status}',
+                                   'Папка уже существует')
+            return status
+        else:
+            self.callbacks.on_error(f'Код ошибки: {status}', message)
+            return status
+
+    @staticmethod
+    def get_date(publication_date: int) -> str:
+        """
+        Convert a Unix timestamp to a date string.
+
+        Args:
+            publication_date (int): The Unix timestamp.
+
+        Returns:
+            str: The date in the format 'YYYY-MM-DD'.
+        """
+        return (datetime.datetime.fromtimestamp(publication_date).
+                strftime('%Y-%m-%d'))
+
+    def get_equal_likes_id(self, data_list: list[PhotoRecord], number: int):
+        """
+        Find and store in object's parameters IDs of photos with the same
+        number of likes, and IDs of those of them that also have the same
+        date.
+
+        Photos are grouped by likes and by likes and date with hash counters,
+        so the check is linear in the number of photos.
+
+        Args:
+            data_list (list[PhotoRecord]): A list of photo records.
+            number (int): The number of photos to check.
+        """
+        photos = data_list[:number]
+        likes_counter = Counter(photo.likes for photo in photos)
+        self.same_id_set = {photo.id for photo in photos
+                            if likes_counter[photo.likes] > 1}
+        date_keys = {photo.id: (photo.likes, self.get_date(photo.date))
+                     for photo in photos if photo.id in self.same_id_set}
+        date_counter = Counter(date_keys.values())
+        self.same_date_id_set = {photo_id
+                                 for photo_id, date_key in date_keys.items()
+                                 if date_counter[date_key] > 1}
+
+    @staticmethod
+    def get_filename(photo_id_set: set, photo_data: PhotoRecord,
+                     same_date_id_set: set = frozenset()) -> str:
+        """
+        Generate a filename based on the photo's likes and date of download.
+
+        The date is added if other photos have the same likes, the photo ID
+        is added if other photos also have the same date.
+
+        Args:
+            photo_id_set (set): A set of IDs of photos with the same likes.
+            photo_data (PhotoRecord): The photo record.
+            same_date_id_set (set, optional): A set of IDs of photos with
+            the same likes and date. Defaults to an empty set.
+
+        Returns:
+            str: The generated filename.
+        """
+        if photo_data.id in same_date_id_set:
+            filename = (f'{photo_data.likes}_'
+                        f'{APIYaDiClient.get_date(photo_data.date)}_'
+                        f'{photo_data.id}')
+            return filename
+        elif photo_data.id in photo_id_set:
+            filename = (f'{photo_data.likes}_'
+                        f'{APIYaDiClient.get_date(photo_data.date)}')
+            return filename
+        else:
+            filename = f'{photo_data.likes}'
+            return filename
+
+    @staticmethod
+    def get_file_extension(url_string: str) -> str:
+        """
+        Extract the file extension from a URL.
+
+        Args:
+            url_string (str): The URL of the file.
+
+        Returns:
+            str: The file extension.
+        """
+        return url_string.rpartition('?')[0].rpartition('.')[2]
+
+    def post_upload_request(self, params: dict,
+                            headers: dict) -> requests.Response:
+        """
+        Send an upload request.
+
+        Args:
+            params (dict): The parameters of the upload request.
+            headers (dict): The headers of the upload request.
+
+        Returns:
+            requests.Response: The response of the upload request.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        response = self.session.post(f'{self.BASE_API_YADI_URL}/upload',
+                                     params = params, headers = headers,
+                                     timeout = self.timeout)
+        response.raise_for_status()
+        return response
+
+    def get_upload_link(self, path: str, headers: dict) -> str:
+        """
+        Get a link for uploading a file to Yandex Disk.
+
+        Args:
+            path (str): The path of the file on Yandex Disk.
+            headers (dict): The headers of the request.
+
+        Returns:
+            str: The URL to PUT the file to.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed.
+        """
+        response = self.session.get(f'{self.BASE_API_YADI_URL}/upload',
+                                    params = {'path': path},
+                                    headers = headers,
+                                    timeout = self.timeout)
+        response.raise_for_status()
+        return response.json()['href']
+
+    def fan_out(self, chunks: Iterable[bytes], path: str,
+                destinations: list[BackupDestination]) -> list:
+        """
+        Write the content of a photo to several destinations at once.
+
+        Every destination reads the chunks from its own bounded queue in
+        a thread of fan_out_executor, so the photo is downloaded once and
+        at most FAN_OUT_QUEUE_SIZE chunks are buffered per destination.
+
+        Args:
+            chunks (Iterable[bytes]): The content of the photo.
+            path (str): The path of the file in the destinations.
+            destinations (list[BackupDestination]): The destinations.
+
+        Returns:
+            list: The results of write_file in the order of destinations.
+
+        Raises:
+            OSError: If the photo can't be read or written to any
+            destination, including requests.exceptions.RequestException.
+        """
+        if len(destinations) == 1:
+            return [destinations[0].write_file(path, chunks)]
+        queues = [queue.Queue(self.FAN_OUT_QUEUE_SIZE)
+                  for _ in destinations]
+
+        def iter_queue(chunk_queue: queue.Queue) -> Iterator[bytes]:
+            while (chunk := chunk_queue.get()) is not None:
+                if chunk is False:
+                    raise OSError('Чтение фотографии прервано')
+                yield chunk
+
+        futures = [self.fan_out_executor.submit(destination.write_file, path,
+                                                iter_queue(chunk_queue))
+                   for destination, chunk_queue in zip(destinations, queues)]
+
+        def put(chunk: bytes | bool | None):
+            for chunk_queue, future in zip(queues, futures):
+                while not future.done():
+                    try:
+                        chunk_queue.put(chunk, timeout = 0.1)
+                        break
+                    except queue.Full:
+                        pass
+
+        try:
+            for chunk in chunks:
+                put(chunk)
+        except BaseException:
+            put(False)
+            wait(futures)
+            raise
+        put(None)
+        return [future.result() for future in futures]
+
+    def transfer_photo(self, params: dict, headers: dict,
+                       chunks: Iterable[bytes] | None = None
+                       ) -> requests.Response:
+        """
+        Upload a photo to Yandex Disk in the transfer mode of the client and
+        write it to the mirrors, downloading it from VK at most once.
+
+        The downloaded photo goes to Yandex Disk and the mirrors at once.
+        Yandex Disk fetches the photo by URL only in the url transfer mode
+        without mirrors, when the photo is not downloaded by the client at
+        all.
+
+        Args:
+            params (dict): The parameters of the upload request with the
+            path on Yandex Disk and the URL of the photo.
+            headers (dict): The headers of Yandex Disk API requests.
+            chunks (Iterable[bytes] | None, optional): The content of
+            the photo if it is already downloaded. Defaults to None.
+
+        Returns:
+            requests.Response: The response of the upload request.
+
+        Raises:
+            OSError: If the photo can't be uploaded or written to a mirror,
+            including requests.exceptions.RequestException.
+        """
+        if (self.transfer_mode == 'url' and not self.mirrors and
+                chunks is None):
+            return self.post_upload_request(params, headers)
+        destinations = [YandexDiskDestination(self, headers), *self.mirrors]
+        if chunks is None:
+            with self.session.get(params['url'], stream = True,
+                                  timeout = self.timeout) as source:
+                source.raise_for_status()
+                results = self.fan_out(
+                    source.iter_content(self.STREAM_CHUNK_SIZE),
+                    params['path'], destinations)
+        else:
+            results = self.fan_out(chunks, params['path'], destinations)
+        return results[0]
+
+    def deduplicated_upload_request(self, params: dict, headers: dict
+                                    ) -> requests.Response | None:
+        """
+        Download a photo from VK once, compute its MD5 hash and upload it
+        only if the target directory has no file with the same content.
+
+        The hash is reserved for the path of the photo until
+        complete_upload_job records the final status, so a repeated fetch
+        of the same photo is not taken for its own duplicate. The downloaded
+        content is written by transfer_photo.
+
+        Args:
+            params (dict): The parameters of the upload request with the
+            path on Yandex Disk and the URL of the photo.
+            headers (dict): The headers of Yandex Disk API requests.
+
+        Returns:
+            requests.Response | None: The response of the upload request or
+            None if the photo is a duplicate.
+
+        Raises:
+            OSError: If the photo can't be uploaded or written to a mirror,
+            including requests.exceptions.RequestException.
+        """
+        md5 = hashlib.md5()
+        chunks = []
+        with self.session.get(params['url'], stream = True,
+                              timeout = self.timeout) as source:
+            source.raise_for_status()
+            for chunk in source.iter_content(self.STREAM_CHUNK_SIZE):
+                md5.update(chunk)
+                chunks.append(chunk)
+        photo_hash = md5.hexdigest()
+        hashes = self.index.get_hashes(params['path'].rpartition('/')[0])
+        with self.hash_lock:
+            if (photo_hash in hashes and
+                    self.hash_owners.get(params['path']) != photo_hash):
+                return None
+            hashes.add(photo_hash)
+            self.hash_owners[params['path']] = photo_hash
+        try:
+            return self.transfer_photo(params, headers, chunks)
+        except OSError:
+            self.release_hash(params['path'])
+            raise
+
+    def release_hash(self, path: str, keep: bool = False):
+        """
+        Release the hash reserved by deduplicated_upload_request for a path.
+
+        Args:
+            path (str): The path of the photo on Yandex Disk.
+            keep (bool, optional): Whether the photo was uploaded and its
+            hash stays in the hashes of the directory. Defaults to False.
+
+        Returns:
+            None
+        """
+        with self.hash_lock:
+            photo_hash = self.hash_owners.pop(path, None)
+            if photo_hash and not keep:
+                self.index.get_hashes(path.rpartition('/')[0]).discard(
+                    photo_hash)
+
+    def send_upload_request(self, params: dict, headers: dict
+                            ) -> requests.Response | None:
+        """
+        Upload a photo in the transfer mode of the client.
+
+        Args:
+            params (dict): The parameters of the upload request.
+            headers (dict): The headers of Yandex Disk API requests.
+
+        Returns:
+            requests.Response | None: The response of the upload request or
+            None if the photo is a duplicate.
+
+        Raises:
+            OSError: If the photo can't be uploaded or written to a mirror,
+            including requests.exceptions.RequestException.
+        """
+        if self.deduplicate:
+            return self.deduplicated_upload_request(params, headers)
+        return self.transfer_photo(params, headers)
+
+    def complete_upload_job(self, upload_job: tuple[int, dict, dict],
+                            status: str, item_number: int) -> dict:
+        """
+        Record the final status of an upload in the manifest and the result
+        report and update the progress.
+
+        Args:
+            upload_job (tuple[int, dict, dict]): The photo ID, the request
+            parameters and the report entry of the photo.
+            status (str): The final status: 'success', 'failed' or
+            'duplicate'.
+            item_number (int): The number of photos to upload.
+
+        Returns:
+            dict: The report entry with the status.
+        """
+        photo_id, params, report_entry = upload_job
+        if self.index and status == 'success':
+            self.index.add_file(params['path'])
+        if self.deduplicate and status != 'duplicate':
+            self.release_hash(params['path'], keep = status == 'success')
+        if self.manifest:
+            self.manifest.add(photo_id, params['path'],
+                              {'success': 'uploaded',
+                               'duplicate': 'duplicate'}.get(status,
+                                                             'failed'))
+        self.upload_counter += 1
+        self.callbacks.on_progress(self.upload_counter, item_number)
+        report_entry = {**report_entry, 'status': status}
+        if self.result_writer:
+            self.result_writer.write(report_entry)
+        return report_entry
+
+    def run_upload_jobs(self, upload_jobs: list[tuple[int, dict, dict]],
+                        headers: dict, item_number: int) -> list[dict]:
+        """
+        Send upload requests concurrently, at most max_workers at a time,
+        and wait until Yandex Disk fetches the photos.
+
+        Photos recorded in the manifest as uploaded to the same directory or
+        whose path is taken according to the remote index are skipped,
+        as well as duplicates if deduplicate is set. Operations
+        of accepted requests are polled by
+        an OperationTracker alongside the uploads, so a photo is counted as
+        soon as its fetch finishes, failed fetches are requested again up to
+        FETCH_RETRIES times. Requests failed with transient errors are
+        sent again after the delay of retry_policy, other failed requests
+        only fail their photo. Every final status is recorded in
+        the manifest.
+
+        Args:
+            upload_jobs (list[tuple[int, dict, dict]]): A list of tuples,
+            where each tuple contains the photo ID, the request parameters
+            and the report entry of the photo.
+            headers (dict): The headers of the upload requests.
+            item_number (int): The number of photos to upload.
+
+        Returns:
+            list[dict]: A list of report entries with the status 'success',
+            'failed', 'skipped' or 'duplicate' in the order of upload_jobs.
+        """
+        result_report = [{} for _ in upload_jobs]
+        pending_indexes = []
+        for index, (photo_id, params, report_entry) in enumerate(upload_jobs):
+            if ((self.manifest and
+                    self.manifest.is_uploaded(photo_id, params['path'])) or
+                    (self.index and self.index.exists(params['path']))):
+                result_report[index] = {**report_entry, 'status': 'skipped'}
+                if self.result_writer:
+                    self.result_writer.write(result_report[index])
+                self.upload_counter += 1
+            else:
+                pending_indexes.append(index)
+        if self.upload_counter:
+            self.callbacks.on_progress(self.upload_counter, item_number)
+        executor = ThreadPoolExecutor(max_workers = self.max_workers)
+        tracker = OperationTracker(self.session, headers, self.timeout)
+        fetch_attempts = dict.fromkeys(pending_indexes, 0)
+        retry_attempts = dict.fromkeys(pending_indexes, 0)
+        delayed = []
+        futures = {executor.submit(self.send_upload_request,
+                                   upload_jobs[index][1], headers): index
+                   for index in pending_indexes}
+        try:
+            while futures or tracker.operations or delayed:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    _, index = heapq.heappop(delayed)
+                    futures[executor.submit(self.send_upload_request,
+                                            upload_jobs[index][1],
+                                            headers)] = index
+                tracker.poll()
+                timeouts = [delayed[0][0] - now] if delayed else []
+                if tracker.time_to_next_poll() is not None:
+                    timeouts.append(tracker.time_to_next_poll())
+                poll_timeout = max(0.0, min(timeouts)) if timeouts else None
+                if futures or tracker.pending:
+                    done, _ = wait([*futures, *tracker.pending],
+                                   timeout = poll_timeout,
+                                   return_when = FIRST_COMPLETED)
+                else:
+                    time.sleep(poll_timeout)
+                    done = ()
+                for future in done:
+                    if future not in futures:
+                        continue
+                    index = futures.pop(future)
+                    try:
+                        response = future.result()
+                    except OSError as e:
+                        if self.retry_policy.should_retry(
+                                e, retry_attempts[index]):
+                            heapq.heappush(delayed, (
+                                time.monotonic() +
+                                self.retry_policy.get_delay(
+                                    retry_attempts[index], e), index))
+                            retry_attempts[index] += 1
+                            self.retry_policy.record_retry(e)
+                        else:
+                            logger.warning('Ошибка загрузки фотографии '
+                                           '%s: %s',
+                                           upload_jobs[index][1]['path'], e)
+                            result_report[index] = self.complete_upload_job(
+                                upload_jobs[index], 'failed', item_number)
+                        continue
+                    if response is None:
+                        result_report[index] = self.complete_upload_job(
+                            upload_jobs[index], 'duplicate', item_number)
+                    elif response.status_code == 202:
+                        tracker.add(index, response.json()['href'])
+                    else:
+                        result_report[index] = self.complete_upload_job(
+                            upload_jobs[index], 'success', item_number)
+                for index, status in tracker.collect().items():
+                    if (status == 'failed' and
+                            fetch_attempts[index] < self.FETCH_RETRIES):
+                        fetch_attempts[index] += 1
+                        futures[executor.submit(self.send_upload_request,
+                                                upload_jobs[index][1],
+                                                headers)] = index
+                    else:
+                        result_report[index] = self.complete_upload_job(
+                            upload_jobs[index], status, item_number)
+        finally:
+            executor.shutdown(wait = False, cancel_futures = True)
+            tracker.close()
+        return result_report
+
+    def select_photos(self, photo_data_lists: list[Iterable[PhotoRecord]],
+                      item_number: int) -> list[list[PhotoRecord]]:
+        """
+        Take the photos of the highest priority of every set and choose
+        their size variants to fit in the byte budget of the run.
+
+        Args:
+            photo_data_lists (list[Iterable[PhotoRecord]]): Lists or
+            iterators of photo records, such as
+            VKAPIClient.iter_album_photos.
+            item_number (int): The number of photos of each set to upload.
+
+        Returns:
+            list[list[PhotoRecord]]: The photos to upload of every set in
+            the order of priority.
+        """
+        with self.metrics.stage('prepare_upload'):
+            photo_lists = [self.scheduler.top(photo_data_list, item_number)
+                           for photo_data_list in photo_data_lists]
+            self.size_selector.fit_budget([photo for photos in photo_lists
+                                           for photo in photos])
+        return photo_lists
+
+    def build_upload_jobs(self, photos: list[PhotoRecord],
+                          directory_name: str, report_prefix: str = ''
+                          ) -> list[tuple[int, dict, dict]]:
+        """
+        Build upload requests for photos of a set.
+
+        A photo the manifest records in the target directory keeps its
+        recorded file name, so it is skipped even if its likes changed.
+        If if_exists is 'rename', a file name already taken in the target
+        directory is extended with the date and the photo ID.
+
+        Args:
+            photos (list[PhotoRecord]): The photos to upload, returned by
+            select_photos.
+            directory_name (str): The name of the directory to upload to.
+            report_prefix (str, optional): The prefix of file names in the
+            report. Defaults to ''.
+
+        Returns:
+            list[tuple[int, dict, dict]]: A list of tuples, where each tuple
+            contains the photo ID, the request parameters and the report
+            entry of the photo, with the type of the chosen size variant.
+        """
+        self.get_equal_likes_id(photos, len(photos))
+        upload_jobs = []
+        for item in photos:
+            filename = self.get_filename(self.same_id_set, item,
+                                         self.same_date_id_set)
+            file_extension = self.get_file_extension(item.url)
+            file_name = f'{filename}.{file_extension}'
+            uploaded_path = (self.manifest.get_uploaded_path(item.id,
+                                                             directory_name)
+                             if self.manifest else None)
+            if uploaded_path:
+                file_name = uploaded_path.rpartition('/')[2]
+            elif (self.if_exists == 'rename' and self.index and
+                    self.index.exists(f'{directory_name}/{file_name}')):
+                file_name = (f'{self.get_filename(set(), item, {item.id})}.'
+                             f'{file_extension}')
+            params = self.get_base_params()
+            params['path'] = f'{directory_name}/{file_name}'
+            params['url'] = item.url
+            upload_jobs.append((item.id, params, {
+                'file_name': f'{report_prefix}{file_name}',
+                'size': item.size_type}))
+        return upload_jobs
+
+    def finish_upload(self, upload_jobs: list[tuple[int, dict, dict]]
+                      ) -> list:
+        """
+        Run upload requests, writing every result to the report as soon as
+        it is known, and save the metrics.
+
+        Args:
+            upload_jobs (list[tuple[int, dict, dict]]): A list of tuples,
+            where each tuple contains the photo ID, the request parameters
+            and the report entry of the photo.
+
+        Returns:
+            list: A list of dictionaries containing upload results.
+        """
+        self.callbacks.on_start(len(upload_jobs))
+        headers = self.get_base_headers()
+        headers.update({'Authorization': f'OAuth {self.token}'})
+        self.result_writer = ResultWriter(self.result_path)
+        try:
+            with self.metrics.stage('upload'):
+                result_report = self.run_upload_jobs(upload_jobs, headers,
+                                                     len(upload_jobs))
+        finally:
+            self.result_writer.close()
+            self.result_writer = None
+        self.metrics.write(self.result_path)
+        self.callbacks.on_finish(result_report)
+        failed_number = sum(report_entry['status'] == 'failed'
+                            for report_entry in result_report)
+        if failed_number:
+            self.callbacks.on_error('Ошибка загрузки',
+                                    f'Яндекс.Диск не смог загрузить '
+                                    f'{failed_number} фотографий')
+        return result_report
+
+    def upload_photo(self, photo_data_list: Iterable[PhotoRecord],
+                     item_number: int,
+                     directory_name: str):
+        """
+        Upload the photos of the highest priority to Yandex Disk, in
+        the order of priority.
+
+        Args:
+            photo_data_list (Iterable[PhotoRecord]): A list or an iterator of
+            photo records, such as VKAPIClient.iter_album_photos.
+            item_number (int): The number of photos to upload.
+            directory_name (str): The name of the directory to upload to.
+
+        Returns:
+            list: A list of dictionaries containing upload results.
+        """
+        if not self.load_remote_index(directory_name):
+            return []
+        status = self.create_directory(directory_name)
+        if status == 201 or status == 409:
+            try:
+                photos, = self.select_photos([photo_data_list], item_number)
+                upload_jobs = self.build_upload_jobs(photos, directory_name)
+            except requests.RequestException as e:
+                self.callbacks.on_error('Ошибка', f'Ошибка соединения: {e}')
+                return []
+            except VKAPIError as e:
+                self.callbacks.on_error('Ошибка', e.error_msg)
+                return []
+            return self.finish_upload(upload_jobs)
+        else:
+            self.callbacks.on_error('Ошибка', 'Ошибка создания директории!')
+            return []
+
+    def upload_photo_sets(self, photo_sets: dict[int, list[PhotoRecord]],
+                          item_number: int, directory_name: str):
+        """
+        Upload photos of several users to Yandex Disk, each user to
+        a subdirectory named after the user ID, the photos of all users in
+        the order of priority. The directory and
+        the subdirectories of the users are listed once into the remote
+        index.
+
+        Args:
+            photo_sets (dict[int, list[PhotoRecord]]): A dictionary mapping
+            the user ID to a list of photo records.
+            item_number (int): The number of photos of each user to upload.
+            directory_name (str): The name of the directory to upload to.
+
+        Returns:
+            list: A list of dictionaries containing upload results.
+        """
+        if not self.load_remote_index(
+                directory_name, [f'{directory_name}/{user_id}'
+                                 for user_id in photo_sets]):
+            return []
+        status = self.create_directory(directory_name)
+        if status != 201 and status != 409:
+            self.callbacks.on_error('Ошибка', 'Ошибка создания директории!')
+            return []
+        upload_jobs = []
+        photo_lists = self.select_photos(list(photo_sets.values()),
+                                         item_number)
+        photos_of_jobs = [photo for photos in photo_lists
+                          for photo in photos]
+        for user_id, photos in zip(photo_sets, photo_lists):
+            user_directory = f'{directory_name}/{user_id}'
+            status, message = self.put_directory(user_directory)
+            if status != 201 and status != 409:
+                self.callbacks.on_error(f'Код ошибки: {status}', message)
+                return []
+            upload_jobs.extend(self.build_upload_jobs(
+                photos, user_directory, f'{user_id}/'))
+        return self.finish_upload(self.scheduler.order(photos_of_jobs,
+                                                       upload_jobs))